@@ -0,0 +1,90 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from api.metrics import metrics
+
+from recipes.versions import (INGREDIENTS_VERSION, RECIPE_VERSION,
+                              TAGS_VERSION, USER_VERSION, get_versions)
+
+RECIPE_CACHE_KEY = 'recipe-repr:{host}:{id}:{recipe}:{author}:{tags}:{ingr}'
+
+
+class RecipeRepresentationCache:
+    """Двухуровневый кэш представлений рецептов.
+
+    Первый уровень — LRU в памяти процесса, второй — кэш Django
+    (locmem в тестах, общий бэкенд для нескольких воркеров gunicorn).
+    Ключ содержит версии рецепта, автора, тегов и ингредиентов,
+    поэтому изменение любого из них делает старые записи недоступными.
+    Попадания и промахи считаются в метриках всех воркеров.
+    """
+
+    def __init__(self, alias='default', local_size=1024, timeout=None):
+        self.alias = alias
+        self.local_size = local_size
+        self.timeout = timeout
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def get_many(self, recipes, host=''):
+        """Ключи и закэшированные представления для списка рецептов."""
+        names = {INGREDIENTS_VERSION, TAGS_VERSION}
+        for recipe in recipes:
+            names.add(RECIPE_VERSION.format(recipe.id))
+            names.add(USER_VERSION.format(recipe.author_id))
+        versions = get_versions(names)
+        keys = {
+            recipe.id: RECIPE_CACHE_KEY.format(
+                host=host,
+                id=recipe.id,
+                recipe=versions[RECIPE_VERSION.format(recipe.id)],
+                author=versions[USER_VERSION.format(recipe.author_id)],
+                tags=versions[TAGS_VERSION],
+                ingr=versions[INGREDIENTS_VERSION],
+            )
+            for recipe in recipes
+        }
+        found = {}
+        with self._lock:
+            for key in keys.values():
+                if key in self._local:
+                    self._local.move_to_end(key)
+                    found[key] = self._local[key]
+        metrics.increment('recipe_cache_local_hits', len(found))
+        missing = [key for key in keys.values() if key not in found]
+        if missing:
+            shared = self.shared.get_many(missing)
+            metrics.increment('recipe_cache_shared_hits', len(shared))
+            metrics.increment(
+                'recipe_cache_misses', len(missing) - len(shared)
+            )
+            with self._lock:
+                for key, data in shared.items():
+                    self.__store_local(key, data)
+            found.update(shared)
+        return {
+            recipe_id: (key, found.get(key))
+            for recipe_id, key in keys.items()
+        }
+
+    def set(self, key, data):
+        """Сохранение представления на обоих уровнях."""
+        self.shared.set(key, data, timeout=self.timeout)
+        with self._lock:
+            self.__store_local(key, data)
+
+    def __store_local(self, key, data):
+        self._local[key] = data
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+
+recipe_cache = RecipeRepresentationCache(**settings.RECIPE_CACHE)
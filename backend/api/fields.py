@@ -1,8 +1,36 @@
 import base64
+import binascii
 
+from django.conf import settings
 from django.core.files.base import ContentFile
+from PIL import ImageFile
 from rest_framework import serializers
 
+HEADER_BASE64_LENGTH = 64 * 1024
+
+
+def check_image_limits(imgstr):
+    """Проверка размера и разрешения до полного декодирования."""
+    if len(imgstr) * 3 // 4 > settings.IMAGE_MAX_SIZE:
+        raise serializers.ValidationError(
+            'Размер изображения не должен превышать '
+            f'{settings.IMAGE_MAX_SIZE // (1024 * 1024)} МБ.'
+        )
+    try:
+        header = base64.b64decode(imgstr[:HEADER_BASE64_LENGTH])
+    except (binascii.Error, ValueError):
+        raise serializers.ValidationError('Некорректные данные base64.')
+    parser = ImageFile.Parser()
+    try:
+        parser.feed(header)
+    except OSError:
+        return
+    if parser.image and max(parser.image.size) > settings.IMAGE_MAX_DIMENSION:
+        raise serializers.ValidationError(
+            'Сторона изображения не должна превышать '
+            f'{settings.IMAGE_MAX_DIMENSION} пикселей.'
+        )
+
 
 class Base64ImageFieldSerializer(serializers.ImageField):
     """Сериализатор для обработки полей изображений."""
@@ -12,5 +40,6 @@ class Base64ImageFieldSerializer(serializers.ImageField):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
+            check_image_limits(imgstr)
             data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
         return super().to_internal_value(data)
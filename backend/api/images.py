@@ -0,0 +1,71 @@
+import io
+import os
+
+from django.core.files.base import ContentFile
+from PIL import Image
+
+from recipes.models import Recipe
+from recipes.versions import bump_version
+
+DERIVATIVES = {
+    'thumbnail': ((150, 150), None),
+    'card': ((600, 600), None),
+    'webp': ((600, 600), 'WEBP'),
+}
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+
+def build_derivatives(file):
+    """Уменьшенные копии изображения; возвращает пути в хранилище."""
+    stem = os.path.splitext(os.path.basename(file.name))[0]
+    directory = os.path.join(os.path.dirname(file.name), 'derivatives')
+    paths = {}
+    with file.open('rb'), Image.open(file) as image:
+        image.load()
+        for name, (size, image_format) in DERIVATIVES.items():
+            image_format = image_format or image.format or 'PNG'
+            if image_format not in EXTENSIONS:
+                image_format = 'PNG'
+            derivative = image.copy()
+            derivative.thumbnail(size)
+            if image_format == 'JPEG' and derivative.mode not in ('RGB', 'L'):
+                derivative = derivative.convert('RGB')
+            buffer = io.BytesIO()
+            derivative.save(buffer, format=image_format, quality=85)
+            paths[name] = file.storage.save(
+                os.path.join(
+                    directory, f'{stem}_{name}.{EXTENSIONS[image_format]}'
+                ),
+                ContentFile(buffer.getvalue())
+            )
+    return paths
+
+
+def replace_derivatives(model, pk, image_field, derivatives_field,
+                        version_name):
+    """Построение копий и замена старых в записи модели."""
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        # Запись удалена раньше, чем до неё дошла очередь.
+        return
+    file = getattr(instance, image_field)
+    old_paths = getattr(instance, derivatives_field).values()
+    # Файла может не быть в хранилище у загруженных и синтетических
+    # записей: копии тогда не строятся.
+    exists = file and file.storage.exists(file.name)
+    paths = build_derivatives(file) if exists else {}
+    model.objects.filter(pk=pk).update(**{derivatives_field: paths})
+    bump_version(version_name.format(pk))
+    for path in old_paths:
+        if path not in paths.values():
+            file.storage.delete(path)
+
+
+def get_image_urls(paths, request=None):
+    """Ссылки на копии изображения."""
+    storage = Recipe._meta.get_field('image').storage
+    urls = {}
+    for name, path in paths.items():
+        url = storage.url(path)
+        urls[name] = request.build_absolute_uri(url) if request else url
+    return urls
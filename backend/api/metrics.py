@@ -0,0 +1,274 @@
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+FILE_PREFIX = 'metrics-'
+COUNTERS = ('count', 'latency', 'queries', 'db_time', 'bytes')
+# Файл воркера, не обновлявшийся столько интервалов сброса, считается
+# оставшимся от завершённого процесса.
+STALE_FLUSH_INTERVALS = 10
+
+
+def empty_row():
+    return {
+        'count': 0,
+        'latency': 0.0,
+        'buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+        'queries': 0,
+        'db_time': 0.0,
+        'bytes': 0,
+    }
+
+
+class Metrics:
+    """Метрики запросов процесса с периодическим сбросом в файл.
+
+    Каждый воркер gunicorn пишет свой файл в METRICS_DIR из фонового
+    потока, эндпоинт метрик суммирует файлы всех воркеров. Кроме
+    запросов учитываются именованные счётчики, например попадания
+    в кэш представлений рецептов. Имя файла
+    уникально для процесса, даже если ОС повторно выдала тот же PID,
+    а файлы завершённых воркеров удаляются по времени изменения.
+    """
+
+    def __init__(self, directory, flush_interval):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._data = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self.path = None
+
+    def __start(self):
+        """Запуск сброса в файл в текущем процессе."""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        if self._pid is not None:
+            # Дочерний процесс после fork не наследует чужие метрики.
+            self._data = {}
+            self._counters = {}
+        self._pid = pid
+        self.path = os.path.join(
+            self.directory, f'{FILE_PREFIX}{pid}-{uuid.uuid4().hex}.json'
+        )
+        threading.Thread(
+            target=self.__flush_forever, name='metrics-flush', daemon=True
+        ).start()
+
+    def __flush_forever(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Запись метрик процесса в его файл."""
+        with self._lock:
+            snapshot = json.dumps(
+                {'requests': self._data, 'counters': self._counters}
+            )
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as file:
+            file.write(snapshot)
+        os.replace(temporary, self.path)
+
+    def observe(self, view, method, status, latency, queries, db_time,
+                size):
+        """Учёт одного запроса."""
+        key = f'{view}|{method}|{status}'
+        with self._lock:
+            self.__start()
+            row = self._data.get(key)
+            if row is None:
+                row = self._data[key] = empty_row()
+            row['count'] += 1
+            row['latency'] += latency
+            row['buckets'][bisect_left(LATENCY_BUCKETS, latency)] += 1
+            row['queries'] += queries
+            row['db_time'] += db_time
+            row['bytes'] += size
+
+    def increment(self, name, value=1):
+        """Увеличение именованного счётчика."""
+        if not value:
+            return
+        with self._lock:
+            self.__start()
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def __read_snapshots(self):
+        """Снимки метрик текущего процесса и остальных воркеров."""
+        with self._lock:
+            snapshots = [json.loads(json.dumps(
+                {'requests': self._data, 'counters': self._counters}
+            ))]
+        stale_before = (
+            time.time() - STALE_FLUSH_INTERVALS * self.flush_interval
+        )
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if (not name.startswith(FILE_PREFIX)
+                        or not name.endswith('.json') or path == self.path):
+                    continue
+                try:
+                    if os.path.getmtime(path) < stale_before:
+                        os.remove(path)
+                        continue
+                    with open(path) as file:
+                        snapshots.append(json.load(file))
+                except (OSError, ValueError):
+                    continue
+        return snapshots
+
+    def collect(self):
+        """Сумма метрик запросов всех воркеров."""
+        total = {}
+        for snapshot in self.__read_snapshots():
+            for key, row in snapshot.get('requests', {}).items():
+                target = total.setdefault(key, empty_row())
+                for field in COUNTERS:
+                    target[field] += row[field]
+                target['buckets'] = [
+                    a + b for a, b in zip(target['buckets'], row['buckets'])
+                ]
+        return total
+
+    def collect_counters(self):
+        """Сумма именованных счётчиков всех воркеров."""
+        total = {}
+        for snapshot in self.__read_snapshots():
+            for name, value in snapshot.get('counters', {}).items():
+                total[name] = total.get(name, 0) + value
+        return total
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus."""
+        lines = [
+            '# TYPE foodgram_request_duration_seconds histogram',
+            '# TYPE foodgram_request_db_queries_total counter',
+            '# TYPE foodgram_request_db_seconds_total counter',
+            '# TYPE foodgram_response_bytes_total counter',
+        ]
+        for key, row in sorted(self.collect().items()):
+            view, method, status = key.split('|')
+            labels = f'view="{view}",method="{method}",status="{status}"'
+            cumulative = 0
+            for bound, count in zip(
+                (*LATENCY_BUCKETS, '+Inf'), row['buckets']
+            ):
+                cumulative += count
+                lines.append(
+                    'foodgram_request_duration_seconds_bucket'
+                    f'{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines += [
+                f'foodgram_request_duration_seconds_sum{{{labels}}} '
+                f'{row["latency"]}',
+                f'foodgram_request_duration_seconds_count{{{labels}}} '
+                f'{row["count"]}',
+                f'foodgram_request_db_queries_total{{{labels}}} '
+                f'{row["queries"]}',
+                f'foodgram_request_db_seconds_total{{{labels}}} '
+                f'{row["db_time"]}',
+                f'foodgram_response_bytes_total{{{labels}}} {row["bytes"]}',
+            ]
+        for name, value in sorted(self.collect_counters().items()):
+            lines += [
+                f'# TYPE foodgram_{name}_total counter',
+                f'foodgram_{name}_total {value}',
+            ]
+        return '\n'.join(lines) + '\n'
+
+
+class QueryTracker:
+    """Подсчёт запросов к БД и времени их выполнения."""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.time += time.perf_counter() - started
+
+
+class ObservedStream:
+    """Потоковое содержимое ответа, учитываемое при закрытии.
+
+    Запросы к БД считаются только на время получения очередной части,
+    чтобы обёртка не оставалась в соединении между частями ответа.
+    """
+
+    def __init__(self, content, tracker, on_close):
+        self.content = content
+        self.tracker = tracker
+        self.on_close = on_close
+        self.size = 0
+        self.closed = False
+
+    def __iter__(self):
+        iterator = iter(self.content)
+        while True:
+            with connection.execute_wrapper(self.tracker):
+                chunk = next(iterator, None)
+            if chunk is None:
+                return
+            self.size += len(chunk)
+            yield chunk
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.on_close(self.size)
+
+
+class MetricsMiddleware:
+    """Сбор метрик по имени маршрута DRF."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        tracker = QueryTracker()
+        started = time.perf_counter()
+        with connection.execute_wrapper(tracker):
+            response = self.get_response(request)
+
+        def observe(size):
+            match = request.resolver_match
+            metrics.observe(
+                (match.url_name or 'unnamed') if match else 'unresolved',
+                request.method,
+                f'{response.status_code // 100}xx',
+                time.perf_counter() - started,
+                tracker.count,
+                tracker.time,
+                size,
+            )
+
+        if response.streaming:
+            response.streaming_content = ObservedStream(
+                response.streaming_content, tracker, observe
+            )
+        else:
+            observe(len(response.content))
+        return response
+
+
+metrics = Metrics(settings.METRICS_DIR, settings.METRICS_FLUSH_INTERVAL)
@@ -1,7 +1,108 @@
+from base64 import b64decode, b64encode
+from binascii import Error as DecodeError
+from collections import OrderedDict
+
 from django.conf import settings
-from rest_framework.pagination import PageNumberPagination
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import (CursorPagination, PageNumberPagination,
+                                       replace_query_param)
+from rest_framework.response import Response
 
 
 class LimitPagination(PageNumberPagination):
     page_size = settings.PAGE_SIZE
     page_size_query_param = 'limit'
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Курсорная пагинация ленты рецептов по (pub_date, id)."""
+
+    page_size = settings.PAGE_SIZE
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+
+
+class RecipePagination(LimitPagination):
+    """Постраничная пагинация или курсорная при наличии параметра cursor.
+
+    Поиск сортирует рецепты по релевантности, а курсор — по (pub_date, id),
+    поэтому вместе они не используются.
+    """
+
+    cursor_query_param = RecipeCursorPagination.cursor_query_param
+    search_query_param = 'search'
+    search_cursor_message = (
+        'Курсор нельзя использовать вместе с поиском: результаты поиска '
+        'упорядочены по релевантности, используйте параметр page.'
+    )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.cursor_query_param in request.query_params:
+            if request.query_params.get(self.search_query_param):
+                raise ValidationError(
+                    {self.cursor_query_param: [self.search_cursor_message]}
+                )
+            self.cursor_paginator = RecipeCursorPagination()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class FeedCursorPagination(RecipeCursorPagination):
+    """Курсор по (pub_date, id) для ленты из нескольких источников.
+
+    Страница собирается вызывающим кодом, пагинатор только читает
+    и выдаёт курсор следующей страницы; количество не считается.
+    """
+
+    def get_position(self, request):
+        """Размер страницы и (pub_date, id) последнего рецепта."""
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.next_position = None
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            pub_date, id = b64decode(
+                encoded.encode('ascii')
+            ).decode('ascii').split('|')
+            position = parse_datetime(pub_date), int(id)
+        except (DecodeError, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if position[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def paginate_keys(self, keys):
+        """Первые page_size различных ключей (pub_date, id) по убыванию."""
+        keys = sorted(set(keys), reverse=True)
+        if len(keys) > self.page_size:
+            self.next_position = keys[self.page_size - 1]
+        return keys[:self.page_size]
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        pub_date, id = self.next_position
+        encoded = b64encode(
+            f'{pub_date.isoformat()}|{id}'.encode('ascii')
+        ).decode('ascii')
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict((
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data),
+        )))
@@ -1,3 +1,6 @@
+from hmac import compare_digest
+
+from django.conf import settings
 from rest_framework.permissions import SAFE_METHODS, BasePermission
 
 
@@ -17,3 +20,16 @@ class IsAuthorOrReadOnlyPermission(BasePermission):
             request.method in SAFE_METHODS
             or obj.author == request.user
         )
+
+
+class IsMetricsScraperPermission(BasePermission):
+    """Доступ к метрикам для администраторов и по токену METRICS_TOKEN."""
+
+    def has_permission(self, request, view):
+        """Проверка прав доступа к метрикам."""
+        if request.user.is_staff:
+            return True
+        token = settings.METRICS_TOKEN
+        return bool(token) and compare_digest(
+            request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'
+        )
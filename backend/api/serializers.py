@@ -1,19 +1,53 @@
 from django.contrib.auth import get_user_model
-from django.db import transaction
+from django.db import models, transaction
 
 from rest_framework import exceptions, serializers
 from rest_framework.validators import UniqueTogetherValidator
 
 from djoser.serializers import UserSerializer
 
+from api.cache import recipe_cache
 from api.fields import Base64ImageFieldSerializer
+from api.images import get_image_urls
+from api.tasks import (build_avatar_images, build_recipe_images,
+                       fan_out_recipe)
 
 from recipes.models import (Favourite, Ingredient, IngredientRecipe,
-                            Recipe, ShoppingList, Tag)
+                            Recipe, ShoppingList, ShoppingListTotal, Tag)
 from users.models import Follow
 
 User = get_user_model()
 
+BULK_MAX_RECIPES = 100
+
+
+def get_request_host(request):
+    """Хост запроса, от которого зависят абсолютные ссылки."""
+    return request.get_host() if request else ''
+
+
+def get_subscribed_ids(request):
+    """Id авторов, на которых подписан пользователь, один раз за запрос."""
+    if not hasattr(request, 'subscribed_ids'):
+        request.subscribed_ids = set(
+            Follow.objects.filter(
+                user=request.user
+            ).values_list('author_id', flat=True)
+        )
+    return request.subscribed_ids
+
+
+def update_fields(instance, validated_data, *extra_fields):
+    """Сохранение только изменённых полей.
+
+    Счётчики и копии изображений меняются атомарно в обход модели,
+    поэтому полное сохранение затёрло бы их устаревшими значениями.
+    """
+    for field, value in validated_data.items():
+        setattr(instance, field, value)
+    instance.save(update_fields=(*validated_data, *extra_fields))
+    return instance
+
 
 class UserAvatarSerializer(UserSerializer):
     """Сериализатор для аватара пользователя."""
@@ -29,11 +63,18 @@ class UserAvatarSerializer(UserSerializer):
             raise serializers.ValidationError('Поле avatar обязательно!')
         return data
 
+    def update(self, instance, validated_data):
+        """Сохранение аватара и построение его копий."""
+        instance = update_fields(instance, validated_data)
+        build_avatar_images.delay(user_id=instance.id)
+        return instance
+
 
 class FoodgramUserSerializer(UserAvatarSerializer):
     """Сериализатор для работы с пользователями."""
 
     is_subscribed = serializers.SerializerMethodField()
+    avatar_images = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -44,19 +85,25 @@ class FoodgramUserSerializer(UserAvatarSerializer):
             'first_name',
             'last_name',
             'is_subscribed',
-            'avatar'
+            'avatar',
+            'avatar_images'
+        )
+
+    def get_avatar_images(self, obj):
+        """Ссылки на уменьшенные копии аватара."""
+        return get_image_urls(
+            obj.avatar_derivatives, self.context.get('request')
         )
 
     def get_is_subscribed(self, obj):
         """Проверка подписок пользователя."""
         request = self.context.get('request')
-        return (
-            request
-            and request.user.is_authenticated
-            and Follow.objects.filter(
-                user=request.user, author=obj.id
-            ).exists()
-        )
+        if not (request and request.user.is_authenticated):
+            return False
+        subscribed = getattr(obj, 'is_subscribed', None)
+        if subscribed is not None:
+            return subscribed
+        return obj.id in get_subscribed_ids(request)
 
 
 class FollowCreateSerializer(serializers.ModelSerializer):
@@ -104,12 +151,14 @@ class FollowSerializer(FoodgramUserSerializer):
         )
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        queryset = obj.recipes.all()
-        if limit:
-            queryset = queryset[:int(limit)]
-        return ShortRecipeSerializer(queryset, many=True).data
+        recipes = getattr(obj, 'limited_recipes', None)
+        if recipes is None:
+            request = self.context.get('request')
+            limit = request.GET.get('recipes_limit')
+            recipes = obj.recipes.all()
+            if limit and limit.isdigit():
+                recipes = recipes[:int(limit)]
+        return ShortRecipeSerializer(recipes, many=True).data
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -145,10 +194,7 @@ class IngredientsRecipeSerializer(serializers.ModelSerializer):
 class CreateIngredientsInRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор создания ингредиента в создании рецепта."""
 
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
-        write_only=True
-    )
+    id = serializers.IntegerField(write_only=True)
 
     class Meta:
         model = IngredientRecipe
@@ -159,9 +205,7 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для создания рецептов."""
 
     ingredients = CreateIngredientsInRecipeSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all()
-    )
+    tags = serializers.ListField(child=serializers.IntegerField())
     image = Base64ImageFieldSerializer(use_url=True)
 
     class Meta:
@@ -176,9 +220,9 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         )
 
     def to_representation(self, instance):
-        """Метод представления модели."""
+        """Представление рецепта, перечитанного со связанными объектами."""
         serializer = ReadRecipeSerializer(
-            instance,
+            Recipe.objects.with_related().get(pk=instance.pk),
             context={
                 'request': self.context.get('request')
             }
@@ -209,8 +253,24 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Ингредиенты не должны повторяться!'
             )
+        data['tags'] = self.__get_objects(Tag, tags, 'tags')
+        for ingredient, obj in zip(
+            ingredients, self.__get_objects(Ingredient, ids, 'ingredients')
+        ):
+            ingredient['id'] = obj
         return data
 
+    def __get_objects(self, model, ids, field):
+        """Объекты по списку id одним запросом."""
+        found = model.objects.in_bulk(ids)
+        missing = [id for id in ids if id not in found]
+        if missing:
+            raise serializers.ValidationError({
+                field: f'Недопустимый первичный ключ {missing[0]} - '
+                       'объект не существует.'
+            })
+        return [found[id] for id in ids]
+
     def __create_ingredients(self, ingredients, recipe):
         """Метод создания ингредиента."""
         ingredient_data = []
@@ -238,29 +298,98 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
 
         self.__create_ingredients(ingredients, recipe)
         self.__create_tags(tags, recipe)
+        fan_out_recipe.delay(recipe_id=recipe.id)
+        build_recipe_images.delay(recipe_id=recipe.id)
         return recipe
 
+    def __update_ingredients(self, ingredients, recipe):
+        """Изменение только отличающихся ингредиентов рецепта."""
+        current = {
+            item.ingredient_id: item for item in recipe.ingredient_list.all()
+        }
+        amounts = {
+            element['id'].id: element['amount'] for element in ingredients
+        }
+        changes = {}
+        to_create = []
+        to_update = []
+        for ingredient_id, amount in amounts.items():
+            item = current.get(ingredient_id)
+            if item is None:
+                to_create.append(IngredientRecipe(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=amount
+                ))
+                changes[ingredient_id] = amount
+            elif item.amount != amount:
+                changes[ingredient_id] = amount - item.amount
+                item.amount = amount
+                to_update.append(item)
+        removed = [
+            item for ingredient_id, item in current.items()
+            if ingredient_id not in amounts
+        ]
+        for item in removed:
+            changes[item.ingredient_id] = -item.amount
+        if removed:
+            IngredientRecipe.objects.filter(
+                id__in=[item.id for item in removed]
+            ).delete()
+        IngredientRecipe.objects.bulk_create(to_create)
+        IngredientRecipe.objects.bulk_update(to_update, ('amount',))
+        return changes
+
     @transaction.atomic
     def update(self, instance, validated_data):
         """Метод обновления модели."""
-        instance.tags.clear()
-        instance.ingredients.clear()
-
-        self.__create_ingredients(validated_data.pop('ingredients'), instance)
+        changes = self.__update_ingredients(
+            validated_data.pop('ingredients'), instance
+        )
         self.__create_tags(validated_data.pop('tags'), instance)
+        ShoppingListTotal.objects.apply_changes(
+            instance.shopping_recipe.values_list('user_id', flat=True),
+            changes
+        )
+        if 'image' in validated_data:
+            build_recipe_images.delay(recipe_id=instance.id)
+
+        return update_fields(instance, validated_data, 'updated_at')
 
-        return super().update(instance, validated_data)
 
+class RecipeImagesMixin(serializers.Serializer):
+    """Ссылки на уменьшенные копии изображения рецепта."""
 
-class ShortRecipeSerializer(serializers.ModelSerializer):
+    images = serializers.SerializerMethodField()
+
+    def get_images(self, obj):
+        return get_image_urls(
+            obj.image_derivatives, self.context.get('request')
+        )
+
+
+class ShortRecipeSerializer(RecipeImagesMixin, serializers.ModelSerializer):
     """Вспомогательный сериализатор для рецептов."""
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'images', 'cooking_time')
+
 
+class ReadRecipeListSerializer(serializers.ListSerializer):
+    """Список рецептов с пакетным чтением кэша представлений."""
 
-class ReadRecipeSerializer(serializers.ModelSerializer):
+    def to_representation(self, data):
+        recipes = list(
+            data.all() if isinstance(data, models.Manager) else data
+        )
+        entries = recipe_cache.get_many(recipes, get_request_host(
+            self.context.get('request')
+        ))
+        for recipe in recipes:
+            recipe.cache_entry = entries[recipe.id]
+        return super().to_representation(recipes)
+
+
+class ReadRecipeSerializer(RecipeImagesMixin, serializers.ModelSerializer):
     """Сериализатор модели Рецепт."""
 
     author = FoodgramUserSerializer(read_only=True)
@@ -279,34 +408,56 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
             'author',
             'name',
             'image',
+            'images',
             'text',
             'ingredients',
             'is_favorited',
             'is_in_shopping_cart',
             'cooking_time'
         )
+        list_serializer_class = ReadRecipeListSerializer
 
-    def get_is_favorited(self, obj):
-        """Проверка наличия рецепта в избранном."""
+    def to_representation(self, instance):
+        """Представление из кэша с флагами текущего пользователя."""
         request = self.context.get('request')
-        return (
-            request
-            and request.user.is_authenticated
-            and Favourite.objects.filter(
-                user=request.user.id, recipe=obj.id
-            ).exists()
+        entry = getattr(instance, 'cache_entry', None)
+        if entry is None:
+            entry = recipe_cache.get_many(
+                [instance], get_request_host(request)
+            )[instance.id]
+        key, data = entry
+        if data is None:
+            data = super().to_representation(instance)
+            recipe_cache.set(key, data)
+            return data
+        data = dict(data)
+        data['author'] = dict(data['author'])
+        data['author']['is_subscribed'] = (
+            self.fields['author'].get_is_subscribed(instance.author)
         )
+        data['is_favorited'] = self.get_is_favorited(instance)
+        data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(instance)
+        return data
+
+    def __get_flag(self, obj, name, model):
+        """Значение флага из аннотации queryset или запросом к БД."""
+        request = self.context.get('request')
+        if not (request and request.user.is_authenticated):
+            return False
+        flag = getattr(obj, name, None)
+        if flag is not None:
+            return flag
+        return model.objects.filter(
+            user=request.user.id, recipe=obj.id
+        ).exists()
+
+    def get_is_favorited(self, obj):
+        """Проверка наличия рецепта в избранном."""
+        return self.__get_flag(obj, 'is_favorited', Favourite)
 
     def get_is_in_shopping_cart(self, obj):
         """Проверка наличия рецепта в списке покупок."""
-        request = self.context.get('request')
-        return (
-            request
-            and request.user.is_authenticated
-            and ShoppingList.objects.filter(
-                user=request.user.id, recipe=obj.id
-            ).exists()
-        )
+        return self.__get_flag(obj, 'is_in_shopping_cart', ShoppingList)
 
 
 class FavouriteSerializer(serializers.ModelSerializer):
@@ -342,6 +493,41 @@ class ShoppingListSerializer(serializers.ModelSerializer):
             )
         ]
 
+    @transaction.atomic
+    def create(self, validated_data):
+        """Добавление рецепта и его ингредиентов в суммы покупок."""
+        shopping_item = super().create(validated_data)
+        ShoppingListTotal.objects.add_recipe(
+            shopping_item.user_id, shopping_item.recipe_id
+        )
+        return shopping_item
+
     def to_representation(self, instance):
         """Метод представления модели."""
         return ShortRecipeSerializer(instance.recipe).data
+
+
+class BulkRecipesSerializer(serializers.Serializer):
+    """Сериализатор списков рецептов для пакетного изменения."""
+
+    add = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        max_length=BULK_MAX_RECIPES,
+        default=list
+    )
+    remove = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        max_length=BULK_MAX_RECIPES,
+        default=list
+    )
+
+    def validate(self, data):
+        if not data['add'] and not data['remove']:
+            raise serializers.ValidationError(
+                'Укажите рецепты в add или remove!'
+            )
+        if set(data['add']) & set(data['remove']):
+            raise serializers.ValidationError(
+                'Рецепт не может быть одновременно в add и remove!'
+            )
+        return data
@@ -0,0 +1,67 @@
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from api.images import replace_derivatives
+from jobs.queue import task
+from recipes.models import Recipe, TimelineEntry
+from recipes.versions import RECIPE_VERSION, USER_VERSION
+
+User = get_user_model()
+
+DELETE_CHUNK_SIZE = 100
+
+
+@task
+def build_recipe_images(recipe_id):
+    """Уменьшенные копии изображения рецепта."""
+    replace_derivatives(
+        Recipe, recipe_id, 'image', 'image_derivatives', RECIPE_VERSION
+    )
+
+
+@task
+def build_avatar_images(user_id):
+    """Уменьшенные копии аватара."""
+    replace_derivatives(
+        User, user_id, 'avatar', 'avatar_derivatives', USER_VERSION
+    )
+
+
+@task
+def fan_out_recipe(recipe_id):
+    """Раздача нового рецепта в ленты подписчиков автора."""
+    recipe = Recipe.objects.select_related('author').filter(
+        pk=recipe_id
+    ).first()
+    if recipe is not None:
+        TimelineEntry.objects.fan_out(recipe)
+
+
+@task
+def backfill_timelines(author_id):
+    """Рецепты автора, переставшего быть популярным, в ленты подписчиков."""
+    author = User.objects.filter(pk=author_id).first()
+    if author is not None:
+        TimelineEntry.objects.backfill_followers(author)
+
+
+@task
+def delete_files(paths):
+    """Удаление файлов из хранилища."""
+    for path in paths:
+        default_storage.delete(path)
+
+
+@task
+def delete_user(user_id):
+    """Удаление рецептов пользователя порциями, затем самого пользователя."""
+    while True:
+        ids = list(Recipe.objects.filter(
+            author_id=user_id
+        ).values_list('id', flat=True)[:DELETE_CHUNK_SIZE])
+        if not ids:
+            break
+        with transaction.atomic():
+            Recipe.objects.filter(id__in=ids).delete()
+    User.objects.filter(pk=user_id).delete()
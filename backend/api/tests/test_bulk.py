@@ -0,0 +1,93 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from rest_framework.test import APIClient
+
+from recipes.models import (Favourite, FavouriteAndShoppingListManager,
+                            Ingredient, IngredientRecipe, Recipe,
+                            ShoppingList, ShoppingListTotal)
+
+User = get_user_model()
+
+DUMMY_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+
+
+@override_settings(CACHES=DUMMY_CACHES)
+class BulkRecipesTests(TestCase):
+    """Пакетное добавление рецептов в избранное и список покупок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='viewer', email='viewer@example.com',
+            first_name='Viewer', last_name='Viewer', password='password'
+        )
+        cls.ingredient = Ingredient.objects.create(
+            name='мука', measurement_unit='г'
+        )
+        cls.recipes = []
+        for number in range(2):
+            recipe = Recipe.objects.create(
+                author=cls.user, name=f'Рецепт {number}', text='Текст',
+                cooking_time=1, image='recipes/test.png'
+            )
+            IngredientRecipe.objects.create(
+                recipe=recipe, ingredient=cls.ingredient, amount=100
+            )
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post_concurrently(self, url, model):
+        """Запрос, во время которого параллельно добавлен первый рецепт."""
+        add_many = FavouriteAndShoppingListManager.add_many
+        recipe = self.recipes[0]
+
+        def concurrent_add_many(manager, *args, **kwargs):
+            model.objects.create(user=self.user, recipe=recipe)
+            return add_many(manager, *args, **kwargs)
+
+        with mock.patch.object(
+            FavouriteAndShoppingListManager, 'add_many', concurrent_add_many
+        ):
+            response = self.client.post(url, {
+                'add': [recipe.id for recipe in self.recipes]
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        return [item['result'] for item in response.data['results']]
+
+    def test_concurrently_added_favourite_is_counted_once(self):
+        results = self.post_concurrently(
+            '/api/recipes/bulk_favorite/', Favourite
+        )
+        self.assertEqual(results, ['already_added', 'added'])
+        self.assertEqual(
+            list(Recipe.objects.order_by('id').values_list(
+                'favorites_count', flat=True
+            )),
+            [1, 1]
+        )
+
+    def test_concurrently_added_cart_recipe_is_summed_once(self):
+        ShoppingListTotal.objects.add_recipe(self.user.id, self.recipes[0].id)
+        results = self.post_concurrently(
+            '/api/recipes/bulk_shopping_cart/', ShoppingList
+        )
+        self.assertEqual(results, ['already_added', 'added'])
+        self.assertEqual(
+            ShoppingListTotal.objects.get(user=self.user).amount, 200
+        )
+
+    def test_rows_are_inserted_one_by_one_without_returning(self):
+        with mock.patch.object(
+            FavouriteAndShoppingListManager,
+            '_FavouriteAndShoppingListManager__can_return_inserted',
+            return_value=False
+        ):
+            self.test_concurrently_added_favourite_is_counted_once()
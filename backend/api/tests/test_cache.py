@@ -0,0 +1,84 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from rest_framework.test import APIClient
+
+from api.metrics import metrics
+
+from recipes.models import Favourite, Ingredient, IngredientRecipe, Recipe
+from recipes.versions import RECIPE_VERSION, get_version
+
+User = get_user_model()
+
+
+class RecipeRepresentationCacheTests(TestCase):
+    """Кэш представлений рецептов."""
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # Текущий процесс считается запущенным, чтобы не стартовал
+        # фоновый сброс в каталог, удаляемый после теста.
+        patcher = mock.patch.multiple(
+            metrics, directory=directory.name, _data={}, _counters={},
+            _pid=os.getpid(),
+            path=os.path.join(directory.name, 'metrics-test.json')
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.author = self.create_user('author')
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст',
+            cooking_time=1, image='recipes/test.png'
+        )
+        IngredientRecipe.objects.create(
+            recipe=self.recipe, amount=100,
+            ingredient=Ingredient.objects.create(
+                name='мука', measurement_unit='г'
+            )
+        )
+        self.url = f'/api/recipes/{self.recipe.id}/'
+
+    def create_user(self, username):
+        return User.objects.create_user(
+            username=username, email=f'{username}@example.com',
+            first_name=username, last_name=username, password='password'
+        )
+
+    def get(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_edit_bumps_version(self):
+        self.assertEqual(self.get(self.author)['name'], 'Рецепт')
+        version = get_version(RECIPE_VERSION.format(self.recipe.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.name = 'Новый рецепт'
+            self.recipe.save()
+        self.assertGreater(
+            get_version(RECIPE_VERSION.format(self.recipe.id)), version
+        )
+        self.assertEqual(self.get(self.author)['name'], 'Новый рецепт')
+
+    def test_cached_body_gets_viewer_flags(self):
+        fan = self.create_user('fan')
+        Favourite.objects.create(user=fan, recipe=self.recipe)
+        self.assertTrue(self.get(fan)['is_favorited'])
+        self.assertEqual(metrics.collect_counters(), {
+            'recipe_cache_misses': 1
+        })
+        data = self.get(self.create_user('viewer'))
+        self.assertFalse(data['is_favorited'])
+        self.assertFalse(data['is_in_shopping_cart'])
+        self.assertEqual(
+            metrics.collect_counters()['recipe_cache_local_hits'], 1
+        )
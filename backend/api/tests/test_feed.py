@@ -0,0 +1,220 @@
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+
+from api.tasks import backfill_timelines, fan_out_recipe
+from api.tests.test_query_budgets import make_image
+from jobs.models import Job
+from recipes.models import Ingredient, Recipe, Tag, TimelineEntry
+from users.models import Follow
+
+User = get_user_model()
+
+DUMMY_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+
+
+def create_user(name):
+    return User.objects.create_user(
+        username=name, email=f'{name}@example.com',
+        first_name=name, last_name=name, password='password'
+    )
+
+
+def create_recipe(author, number, hours_ago=0):
+    recipe = Recipe.objects.create(
+        author=author, name=f'Рецепт {number}', text='Текст',
+        cooking_time=number + 1, image='recipes/test.png'
+    )
+    recipe.pub_date = timezone.now() - timedelta(hours=hours_ago)
+    Recipe.objects.filter(pk=recipe.pk).update(pub_date=recipe.pub_date)
+    return recipe
+
+
+@override_settings(CACHES=DUMMY_CACHES)
+class SubscribeTests(TestCase):
+    """Подписка на автора и его рецепты в ленте."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.author = create_user('author')
+        cls.recipes = [
+            create_recipe(cls.author, number) for number in range(3)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_subscribe_fills_timeline(self):
+        response = self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertTrue(
+            Follow.objects.filter(user=self.user, author=self.author).exists()
+        )
+        self.assertCountEqual(
+            TimelineEntry.objects.filter(user=self.user).values_list(
+                'recipe_id', flat=True
+            ),
+            [recipe.id for recipe in self.recipes]
+        )
+
+    def test_unsubscribe_trims_timeline(self):
+        self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        response = self.client.delete(
+            f'/api/users/{self.author.id}/subscribe/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+
+    def test_subscribe_twice_is_rejected(self):
+        self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        response = self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CACHES=DUMMY_CACHES, FEED_FANOUT_MAX_FOLLOWERS=2)
+class FeedTests(TestCase):
+    """Лента подписок из TimelineEntry и рецептов популярных авторов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.author = create_user('author')
+        cls.popular = create_user('popular')
+        cls.tag = Tag.objects.create(name='Ужин', slug='dinner')
+        # Рецепты авторов чередуются по времени публикации.
+        cls.recipes = [
+            create_recipe(
+                cls.author if hours % 2 else cls.popular, hours, hours
+            )
+            for hours in range(6)
+        ]
+        cls.recipes[1].tags.set([cls.tag])
+        cls.recipes[2].tags.set([cls.tag])
+        Follow.objects.create(user=create_user('fan'), author=cls.popular)
+        for author in (cls.author, cls.popular):
+            Follow.objects.create(user=cls.user, author=author)
+        User.objects.filter(pk=cls.popular.pk).update(followers_count=2)
+        User.objects.filter(pk=cls.author.pk).update(followers_count=1)
+        TimelineEntry.objects.rebuild()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_ids(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.data)
+        return (
+            [recipe['id'] for recipe in response.data['results']],
+            response.data['next'],
+        )
+
+    def test_pages_merge_timeline_and_popular_authors(self):
+        self.assertFalse(
+            TimelineEntry.objects.filter(author=self.popular).exists()
+        )
+        ids, url = [], '/api/recipes/feed/?limit=4'
+        pages = 0
+        while url:
+            page, url = self.get_ids(url)
+            ids.extend(page)
+            pages += 1
+        self.assertEqual(pages, 2)
+        self.assertEqual(ids, [recipe.id for recipe in self.recipes])
+
+    def test_feed_does_not_count(self):
+        with CaptureQueriesContext(connection) as captured:
+            self.get_ids('/api/recipes/feed/?limit=2')
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] for query in captured.captured_queries
+        ))
+
+    def test_filters_apply_to_both_sources(self):
+        ids, _ = self.get_ids(f'/api/recipes/feed/?tags={self.tag.slug}')
+        self.assertEqual(ids, [self.recipes[1].id, self.recipes[2].id])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/recipes/feed/?cursor=bad')
+        self.assertEqual(response.status_code, 404)
+
+    def test_author_becoming_popular_is_listed_once(self):
+        self.client.force_authenticate(create_user('newcomer'))
+        response = self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.author.refresh_from_db()
+        self.assertTrue(TimelineEntry.objects.is_popular(self.author))
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.user, author=self.author
+            ).exists()
+        )
+        self.client.force_authenticate(self.user)
+        ids, _ = self.get_ids('/api/recipes/feed/?limit=10')
+        self.assertEqual(ids, [recipe.id for recipe in self.recipes])
+
+    def test_author_no_longer_popular_is_backfilled(self):
+        fan = User.objects.get(username='fan')
+        self.client.force_authenticate(fan)
+        response = self.client.delete(
+            f'/api/users/{self.popular.id}/subscribe/'
+        )
+        self.assertEqual(response.status_code, 204)
+        job = Job.objects.get(name='api.tasks.backfill_timelines')
+        self.assertEqual(job.payload, {'author_id': self.popular.id})
+        backfill_timelines(**job.payload)
+        self.assertEqual(
+            TimelineEntry.objects.filter(
+                user=self.user, author=self.popular
+            ).count(),
+            3
+        )
+        self.client.force_authenticate(self.user)
+        ids, _ = self.get_ids('/api/recipes/feed/?limit=10')
+        self.assertEqual(ids, [recipe.id for recipe in self.recipes])
+
+    def test_new_recipe_is_fanned_out_by_job(self):
+        recipe = create_recipe(self.author, 10)
+        job = fan_out_recipe.delay(recipe_id=recipe.id)
+        self.assertEqual(job.name, 'api.tasks.fan_out_recipe')
+        self.assertFalse(
+            TimelineEntry.objects.filter(recipe=recipe).exists()
+        )
+        fan_out_recipe(**job.payload)
+        entry = TimelineEntry.objects.get(recipe=recipe)
+        self.assertEqual(entry.user, self.user)
+        self.assertEqual(entry.pub_date, recipe.pub_date)
+
+    def test_create_enqueues_fan_out(self):
+        self.client.force_authenticate(self.author)
+        ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+        with tempfile.TemporaryDirectory() as media_root:
+            with override_settings(MEDIA_ROOT=media_root):
+                response = self.client.post('/api/recipes/', {
+                    'ingredients': [{'id': ingredient.id, 'amount': 5}],
+                    'tags': [self.tag.id],
+                    'name': 'Новый',
+                    'image': make_image(),
+                    'text': 'Текст',
+                    'cooking_time': 1,
+                }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertTrue(Job.objects.filter(
+            name='api.tasks.fan_out_recipe',
+            payload={'recipe_id': response.data['id']}
+        ).exists())
+        self.assertFalse(TimelineEntry.objects.filter(
+            recipe_id=response.data['id']
+        ).exists())
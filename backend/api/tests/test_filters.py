@@ -0,0 +1,148 @@
+import re
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.test import APIClient
+
+from api.filters import RecipeFilter
+
+from recipes.models import Favourite, Recipe, ShoppingList, Tag
+
+User = get_user_model()
+
+DUMMY_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+# Теги фильтра, количество, рецепты, их ингредиенты и теги, подписки.
+LIST_QUERIES = 6
+JOINED_TABLES = (
+    Recipe.tags.through._meta.db_table,
+    Favourite._meta.db_table,
+    ShoppingList._meta.db_table,
+)
+# Индексы полусоединений фильтров в PostgreSQL.
+SUBQUERY_INDEXES = (
+    'recipe_tags_tag_recipe_idx',
+    'unique_user_and_recipe_in_Favourites',
+    'unique_user_and_recipe_in_ShoppingList',
+)
+
+
+@override_settings(CACHES=DUMMY_CACHES)
+class RecipeFilterTests(TestCase):
+    """Фильтры рецептов через полусоединения без JOIN и DISTINCT."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='viewer', email='viewer@example.com',
+            first_name='Viewer', last_name='Viewer', password='password'
+        )
+        cls.tags = [
+            Tag.objects.create(name=slug, slug=slug)
+            for slug in ('breakfast', 'lunch')
+        ]
+        cls.recipes = []
+        for number in range(3):
+            recipe = Recipe.objects.create(
+                author=cls.user, name=f'Рецепт {number}', text='Текст',
+                cooking_time=number + 1, image='recipes/test.png'
+            )
+            recipe.tags.set(cls.tags)
+            cls.recipes.append(recipe)
+        for recipe in cls.recipes[:2]:
+            Favourite.objects.create(user=cls.user, recipe=recipe)
+            ShoppingList.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_recipes(self):
+        """Ответ списка рецептов и SQL основного запроса."""
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(
+                '/api/recipes/?tags=breakfast&tags=lunch'
+                '&is_favorited=1&is_in_shopping_cart=1'
+            )
+        self.assertEqual(response.status_code, 200)
+        recipe_table = connection.ops.quote_name(Recipe._meta.db_table)
+        queries = [
+            query['sql'] for query in captured.captured_queries
+            if query['sql'].startswith('SELECT')
+            and f'FROM {recipe_table}' in query['sql']
+            and 'COUNT(' not in query['sql']
+        ]
+        self.assertEqual(len(queries), 1)
+        return response, queries[0], len(captured.captured_queries)
+
+    def test_filters_return_each_recipe_once(self):
+        response, _, _ = self.get_recipes()
+        self.assertEqual(response.data['count'], 2)
+        self.assertCountEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [recipe.id for recipe in self.recipes[:2]]
+        )
+
+    def test_filters_use_exists_without_joins(self):
+        _, sql, _ = self.get_recipes()
+        self.assertNotIn('DISTINCT', sql)
+        # Два флага в аннотациях и три фильтра.
+        self.assertEqual(sql.count('EXISTS'), 5)
+        for table in JOINED_TABLES:
+            self.assertIsNone(re.search(
+                rf'JOIN {re.escape(connection.ops.quote_name(table))}', sql
+            ), table)
+
+    def test_query_count_does_not_depend_on_tags(self):
+        _, _, count = self.get_recipes()
+        for number in range(3):
+            Tag.objects.create(name=f'tag{number}', slug=f'tag{number}')
+        for recipe in self.recipes:
+            recipe.tags.set(Tag.objects.all())
+        _, _, more_tags_count = self.get_recipes()
+        self.assertEqual(count, more_tags_count)
+        self.assertEqual(count, LIST_QUERIES)
+
+    def test_search_with_cursor_is_rejected(self):
+        response = self.client.get('/api/recipes/?cursor=&search=Рецепт')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.data)
+        response = self.client.get('/api/recipes/?search=Рецепт')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+
+    @skipUnless(
+        connection.vendor in ('sqlite', 'postgresql'),
+        'План запроса проверяется только для SQLite и PostgreSQL.'
+    )
+    def test_filter_subqueries_use_indexes(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        queryset = RecipeFilter(
+            {
+                'tags': ['breakfast'],
+                'is_favorited': '1',
+                'is_in_shopping_cart': '1',
+            },
+            Recipe.objects.all(),
+            request=request
+        ).qs
+        if connection.vendor == 'sqlite':
+            plan = queryset.explain()
+            self.assertEqual(plan.count('SUBQUERY'), 3)
+            self.assertEqual(
+                plan.count('SEARCH U0 USING COVERING INDEX'), 3
+            )
+            return
+        # На маленьких таблицах PostgreSQL выбирает полный просмотр,
+        # запрещаем его до конца транзакции теста.
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+        for index in SUBQUERY_INDEXES:
+            self.assertIn(index, plan)
@@ -0,0 +1,88 @@
+import json
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from rest_framework.test import APIClient
+
+from api.metrics import STALE_FLUSH_INTERVALS, Metrics, empty_row, metrics
+
+from recipes.models import Ingredient, IngredientRecipe, Recipe, ShoppingList
+
+User = get_user_model()
+
+CART_KEY = 'recipes-download_shopping_cart|GET|2xx'
+
+
+class MetricsTests(TestCase):
+    """Сбор метрик запросов."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        # Текущий процесс считается запущенным, чтобы не стартовал
+        # фоновый сброс в каталог, удаляемый после теста.
+        patcher = mock.patch.multiple(
+            metrics, directory=self.directory, _data={}, _counters={},
+            _pid=os.getpid(),
+            path=os.path.join(self.directory, 'metrics-test.json')
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_worker_file(self, name, age):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as file:
+            json.dump({
+                'requests': {'other|GET|2xx': empty_row()},
+                'counters': {'other_hits': 2},
+            }, file)
+        os.utime(path, (time.time() - age,) * 2)
+        return path
+
+    def test_stale_worker_files_are_removed(self):
+        stale_age = STALE_FLUSH_INTERVALS * metrics.flush_interval
+        stale = self.write_worker_file('metrics-1-dead.json', stale_age + 60)
+        fresh = self.write_worker_file('metrics-2-live.json', 0)
+        collected = Metrics(self.directory, metrics.flush_interval).collect()
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(fresh))
+        self.assertIn('other|GET|2xx', collected)
+
+    def test_counters_are_summed_across_workers(self):
+        self.write_worker_file('metrics-1-live.json', 0)
+        metrics.increment('other_hits', 3)
+        self.assertEqual(metrics.collect_counters(), {'other_hits': 5})
+        self.assertIn('foodgram_other_hits_total 5', metrics.render())
+
+    def test_streaming_response_is_counted_on_close(self):
+        user = User.objects.create_user(
+            username='viewer', email='viewer@example.com',
+            first_name='Viewer', last_name='Viewer', password='password'
+        )
+        recipe = Recipe.objects.create(
+            author=user, name='Рецепт', text='Текст', cooking_time=1,
+            image='recipes/test.png'
+        )
+        IngredientRecipe.objects.create(
+            recipe=recipe, amount=100,
+            ingredient=Ingredient.objects.create(
+                name='мука', measurement_unit='г'
+            )
+        )
+        ShoppingList.objects.create(user=user, recipe=recipe)
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/api/recipes/download_shopping_cart/')
+        self.assertTrue(response.streaming)
+        self.assertNotIn(CART_KEY, metrics.collect())
+        content = b''.join(response.streaming_content)
+        row = metrics.collect()[CART_KEY]
+        self.assertEqual(row['count'], 1)
+        self.assertEqual(row['bytes'], len(content))
+        self.assertGreater(row['queries'], 0)
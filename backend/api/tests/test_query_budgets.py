@@ -0,0 +1,266 @@
+import base64
+import io
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (Favourite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingList, ShoppingListTotal, Tag,
+                            TimelineEntry)
+from users.models import Follow
+
+User = get_user_model()
+
+PASSWORD = 'budget-password-1'
+SIZES = (2, 6)
+DUMMY_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+SAVEPOINT_PREFIXES = (
+    'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT'
+)
+
+# Метка, метод, путь, бюджет запросов, тело запроса.
+ENDPOINTS = (
+    ('tags-list', 'get', '/api/tags/', 3, None),
+    ('tags-detail', 'get', '/api/tags/{tag}/', 3, None),
+    ('ingredients-list', 'get', '/api/ingredients/?name={prefix}', 3, None),
+    ('ingredients-detail', 'get', '/api/ingredients/{ingredient}/', 3, None),
+    ('recipes-list', 'get', '/api/recipes/?limit={limit}', 10, None),
+    (
+        'recipes-list cursor', 'get',
+        '/api/recipes/?cursor=&limit={limit}&is_favorited=1'
+        '&is_in_shopping_cart=1&tags={tag_slug}', 10, None
+    ),
+    ('recipes-detail', 'get', '/api/recipes/{recipe}/', 10, None),
+    ('recipes-feed', 'get', '/api/recipes/feed/?limit={limit}', 10, None),
+    ('recipes-similar', 'get', '/api/recipes/{recipe}/similar/?limit={limit}',
+     10, None),
+    ('recipes-get-link', 'get', '/api/recipes/{recipe}/get-link/', 2, None),
+    (
+        'recipes-download-shopping-cart', 'get',
+        '/api/recipes/download_shopping_cart/?type=csv', 4, None
+    ),
+    ('users-list', 'get', '/api/users/?limit={limit}', 5, None),
+    ('users-detail', 'get', '/api/users/{author}/', 4, None),
+    ('users-me', 'get', '/api/users/me/', 3, None),
+    (
+        'users-subscriptions', 'get',
+        '/api/users/subscriptions/?limit={limit}&recipes_limit={limit}',
+        8, None
+    ),
+    (
+        'users-subscribe', 'post',
+        '/api/users/{stranger}/subscribe/?recipes_limit={limit}', 15, None
+    ),
+    ('users-subscribe delete', 'delete',
+     '/api/users/{stranger}/subscribe/', 10, None),
+    ('recipes-favorite', 'post', '/api/recipes/{fresh}/favorite/', 12, None),
+    ('recipes-favorite delete', 'delete',
+     '/api/recipes/{fresh}/favorite/', 10, None),
+    ('recipes-shopping-cart', 'post',
+     '/api/recipes/{fresh}/shopping_cart/', 15, None),
+    ('recipes-shopping-cart delete', 'delete',
+     '/api/recipes/{fresh}/shopping_cart/', 15, None),
+    ('recipes-bulk-favorite', 'post',
+     '/api/recipes/bulk_favorite/', 15, 'bulk_add'),
+    ('recipes-bulk-shopping-cart', 'post',
+     '/api/recipes/bulk_shopping_cart/', 20, 'bulk_remove'),
+    ('recipes-list create', 'post', '/api/recipes/', 25, 'recipe'),
+    ('recipes-detail update', 'patch', '/api/recipes/{own}/', 30, 'recipe'),
+    ('recipes-detail delete', 'delete', '/api/recipes/{own}/', 20, None),
+    ('users-avatar', 'put', '/api/users/me/avatar/', 6, 'avatar'),
+    ('users-avatar delete', 'delete', '/api/users/me/avatar/', 6, None),
+    ('users-list create', 'post', '/api/users/', 6, 'user'),
+    ('users-set-password', 'post', '/api/users/set_password/', 6,
+     'password'),
+    ('users-me delete', 'delete', '/api/users/me/', 12, 'current_password'),
+)
+
+
+def make_image():
+    """Небольшое изображение в base64."""
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), (90, 160, 60)).save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+class Rollback(Exception):
+    """Откат данных одного замера."""
+
+
+@override_settings(CACHES=DUMMY_CACHES)
+class QueryBudgetTests(TestCase):
+    """Число SQL-запросов эндпоинтов API.
+
+    Эндпоинты прогоняются на двух объёмах данных: число запросов не
+    должно превышать бюджет и расти вместе с данными.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        media_root = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(media_root.cleanup)
+        media = override_settings(MEDIA_ROOT=media_root.name)
+        media.enable()
+        cls.addClassCleanup(media.disable)
+        cls.image = make_image()
+
+    def test_query_budgets(self):
+        counts = {}
+        for size in SIZES:
+            try:
+                with transaction.atomic():
+                    counts[size] = self.measure(size)
+                    raise Rollback
+            except Rollback:
+                pass
+        small, large = SIZES
+        for label, _, _, budget, _ in ENDPOINTS:
+            (small_count, _), (large_count, queries) = (
+                counts[small][label], counts[large][label]
+            )
+            with self.subTest(label):
+                message = '\n'.join(queries)
+                self.assertLessEqual(large_count, budget, message)
+                self.assertLessEqual(large_count, small_count, message)
+
+    def measure(self, size):
+        """Число запросов каждого эндпоинта на наборе заданного размера."""
+        context, payloads, token = self.build(size)
+        client = Client(HTTP_AUTHORIZATION=f'Token {token}')
+        counts = {}
+        for label, method, path, _, payload in ENDPOINTS:
+            path = path.format(**context)
+            with CaptureQueriesContext(connection) as captured:
+                if payload is None:
+                    response = getattr(client, method)(path)
+                else:
+                    response = getattr(client, method)(
+                        path, payloads[payload],
+                        content_type='application/json'
+                    )
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            self.assertLess(
+                response.status_code, 400,
+                f'{label}: {getattr(response, "content", b"")[:500]!r}'
+            )
+            queries = [
+                query['sql'] for query in captured.captured_queries
+                if not query['sql'].startswith(SAVEPOINT_PREFIXES)
+            ]
+            counts[label] = (len(queries), queries)
+        return counts
+
+    def build(self, size):
+        """Набор данных: size авторов по size рецептов с size связями."""
+
+        def create_user(name):
+            return User.objects.create_user(
+                username=f'budget-{size}-{name}',
+                email=f'budget-{size}-{name}@example.com',
+                first_name='Budget',
+                last_name=str(name),
+                password=PASSWORD,
+            )
+
+        def create_recipe(author, number):
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f'Бюджет {size} {number}',
+                text='Рецепт для проверки числа запросов.',
+                cooking_time=number + 1,
+                image='recipes/budget.png',
+            )
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=number + 1
+                )
+                for ingredient in ingredients
+            )
+            recipe.tags.set(tags)
+            return recipe
+
+        viewer = create_user('viewer')
+        stranger = create_user('stranger')
+        tags = [
+            Tag.objects.create(
+                name=f'b{size}-{number}', slug=f'b{size}-{number}'
+            )
+            for number in range(size)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'бюджет{size}-{number}', measurement_unit='г'
+            )
+            for number in range(size)
+        ]
+        recipes = []
+        for number in range(size):
+            author = create_user(number)
+            Follow.objects.create(user=viewer, author=author)
+            recipes.extend(
+                create_recipe(author, index) for index in range(size)
+            )
+        TimelineEntry.objects.rebuild()
+        fresh = create_recipe(stranger, 0)
+        own = create_recipe(viewer, 0)
+        recipe_ids = [recipe.id for recipe in recipes]
+        Favourite.objects.bulk_create(
+            Favourite(user=viewer, recipe=recipe) for recipe in recipes
+        )
+        ShoppingList.objects.bulk_create(
+            ShoppingList(user=viewer, recipe=recipe) for recipe in recipes
+        )
+        ShoppingListTotal.objects.add_recipes(viewer.id, recipe_ids)
+        context = {
+            'stranger': stranger.id,
+            'author': recipes[0].author_id,
+            'recipe': recipes[0].id,
+            'fresh': fresh.id,
+            'own': own.id,
+            'tag': tags[0].id,
+            'tag_slug': tags[0].slug,
+            'ingredient': ingredients[0].id,
+            'prefix': f'бюджет{size}',
+            'limit': size,
+        }
+        payloads = {
+            'recipe': {
+                'ingredients': [
+                    {'id': ingredient.id, 'amount': 10}
+                    for ingredient in ingredients
+                ],
+                'tags': [tag.id for tag in tags],
+                'name': f'Бюджет {size}',
+                'image': self.image,
+                'text': 'Новый рецепт.',
+                'cooking_time': 5,
+            },
+            'bulk_add': {'add': recipe_ids + [fresh.id]},
+            'bulk_remove': {'remove': recipe_ids},
+            'avatar': {'avatar': self.image},
+            'user': {
+                'email': f'budget-{size}-new@example.com',
+                'username': f'budget-{size}-new',
+                'first_name': 'Budget',
+                'last_name': 'New',
+                'password': PASSWORD,
+            },
+            'password': {
+                'new_password': f'{PASSWORD}-new',
+                'current_password': PASSWORD,
+            },
+            'current_password': {'current_password': f'{PASSWORD}-new'},
+        }
+        token = Token.objects.create(user=viewer).key
+        return context, payloads, token
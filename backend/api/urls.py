@@ -2,7 +2,7 @@ from django.urls import include, path, re_path
 from rest_framework import routers
 
 from api.views import (IngredientViewSet, TagViewSet,
-                       RecipeViewSet, FoodgramUserViewSet)
+                       RecipeViewSet, FoodgramUserViewSet, metrics_view)
 
 app_name = 'api'
 
@@ -14,6 +14,7 @@ router.register(r'users', FoodgramUserViewSet, basename='users')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('metrics/', metrics_view, name='metrics'),
     path('auth/', include('djoser.urls')),
     re_path(r'^auth/', include('djoser.urls.authtoken'))
 ]
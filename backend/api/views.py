@@ -1,22 +1,35 @@
-import io
+import csv
+import json
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
-from django.http import HttpResponseRedirect
+from django.db import transaction
+from django.db.models import (BooleanField, Exists, F, OuterRef, Q, Value,
+                              Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.http import (Http404, HttpResponse, HttpResponseRedirect,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404
+from django.utils.http import http_date, parse_http_date_safe
 
 from django_filters.rest_framework import DjangoFilterBackend
+from djoser.utils import logout_user
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
-from rest_framework.decorators import action
-from rest_framework.filters import SearchFilter
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
 from api.filters import RecipeFilter
-from api.permissions import IsAuthorOrReadOnlyPermission
+from api.pagination import FeedCursorPagination, RecipePagination
+from api.metrics import metrics
+from api.permissions import (IsAuthorOrReadOnlyPermission,
+                             IsMetricsScraperPermission)
 from api.serializers import (
+    BulkRecipesSerializer,
     CreateRecipeSerializer,
     FavouriteSerializer,
     FollowCreateSerializer,
@@ -27,17 +40,73 @@ from api.serializers import (
     TagSerializer,
     UserAvatarSerializer,
 )
+from api.tasks import delete_files, delete_user
 from recipes.models import (
     Favourite,
     Ingredient,
-    IngredientRecipe,
     Recipe,
     ShoppingList,
+    ShoppingListTotal,
     Tag,
+    TimelineEntry,
 )
-from users.models import Follow
+from recipes.search import ingredient_index
+from recipes.shortlinks import short_links
+from recipes.similar import similar_recipes
+from recipes.versions import INGREDIENTS_VERSION, TAGS_VERSION, get_version
+from users.models import DEFAULT_AVATAR, Follow
+
 User = get_user_model()
 
+SIMILAR_RECIPES_LIMIT = 10
+SIMILAR_RECIPES_MAX_LIMIT = 50
+
+
+class EchoBuffer:
+    """Буфер, возвращающий записанную строку, для потокового csv."""
+
+    def write(self, value):
+        return value
+
+
+def render_shopping_list_txt(ingredients):
+    """Строки списка покупок в текстовом виде."""
+    for ingredient in ingredients:
+        yield (f'{ingredient["ingredient__name"]} - {ingredient["total"]} '
+               f'({ingredient["ingredient__measurement_unit"]})\n')
+
+
+def render_shopping_list_csv(ingredients):
+    """Строки списка покупок в формате csv."""
+    writer = csv.writer(EchoBuffer())
+    yield writer.writerow(('name', 'amount', 'measurement_unit'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['total'],
+            ingredient['ingredient__measurement_unit'],
+        ))
+
+
+def render_shopping_list_json(ingredients):
+    """Список покупок в формате json, по одному элементу за раз."""
+    separator = '['
+    for ingredient in ingredients:
+        yield separator + json.dumps({
+            'name': ingredient['ingredient__name'],
+            'amount': ingredient['total'],
+            'measurement_unit': ingredient['ingredient__measurement_unit'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': ('text/plain; charset=utf-8', render_shopping_list_txt),
+    'csv': ('text/csv; charset=utf-8', render_shopping_list_csv),
+    'json': ('application/json; charset=utf-8', render_shopping_list_json),
+}
+
 
 class FoodgramUserViewSet(UserViewSet):
     """Вьюсет пользователя."""
@@ -49,6 +118,15 @@ class FoodgramUserViewSet(UserViewSet):
             return (IsAuthenticated(),)
         return super().get_permissions()
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        """Деактивация пользователя и удаление его данных в фоне."""
+        if instance == self.request.user:
+            logout_user(self.request)
+        instance.is_active = False
+        instance.save(update_fields=('is_active',))
+        delete_user.delay(user_id=instance.id)
+
     @action(detail=False,
             methods=('PUT', 'DELETE',),
             url_path='me/avatar',
@@ -68,7 +146,15 @@ class FoodgramUserViewSet(UserViewSet):
             )
         elif request.method == 'DELETE':
             if user.avatar:
-                user.avatar.delete()
+                paths = [
+                    path for path in (
+                        user.avatar.name, *user.avatar_derivatives.values()
+                    ) if path != DEFAULT_AVATAR
+                ]
+                user.avatar = None
+                user.avatar_derivatives = {}
+                user.save(update_fields=('avatar', 'avatar_derivatives'))
+                delete_files.delay(paths=paths)
                 return Response(status=status.HTTP_204_NO_CONTENT)
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
@@ -79,8 +165,15 @@ class FoodgramUserViewSet(UserViewSet):
             url_name='subscriptions')
     def subscriptions(self, request):
         """Просмотр подписок пользователя."""
-        queryset = User.objects.filter(follower__user=request.user)
+        queryset = User.objects.filter(
+            publisher__user=request.user
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        )
         pages = self.paginate_queryset(queryset)
+        self.__attach_limited_recipes(
+            pages, request.query_params.get('recipes_limit')
+        )
         serializer = FollowSerializer(
             pages,
             many=True,
@@ -88,9 +181,35 @@ class FoodgramUserViewSet(UserViewSet):
         )
         return self.get_paginated_response(serializer.data)
 
+    def __attach_limited_recipes(self, authors, limit):
+        """Последние рецепты авторов страницы одним оконным запросом."""
+        if not authors:
+            return
+        recipes = Recipe.objects.filter(author__in=authors)
+        if limit and limit.isdigit():
+            ranked = recipes.annotate(
+                row_number=Window(
+                    expression=RowNumber(),
+                    partition_by=F('author_id'),
+                    order_by=F('pub_date').desc(),
+                )
+            ).values('id', 'row_number')
+            sql, params = ranked.query.sql_with_params()
+            recipes = Recipe.objects.filter(id__in=RawSQL(
+                f'SELECT ranked.id FROM ({sql}) AS ranked '
+                'WHERE ranked.row_number <= %s',
+                (*params, int(limit))
+            ))
+        recipes_by_author = {author.id: [] for author in authors}
+        for recipe in recipes:
+            recipes_by_author[recipe.author_id].append(recipe)
+        for author in authors:
+            author.limited_recipes = recipes_by_author[author.id]
+
     @action(detail=True,
             methods=('POST', 'DELETE',),
             permission_classes=(IsAuthenticated,))
+    @transaction.atomic
     def subscribe(self, request, id=None):
         """Подписка на автора."""
         user = request.user
@@ -100,13 +219,14 @@ class FoodgramUserViewSet(UserViewSet):
             if user == author:
                 return Response({'errors': 'Подписаться на себя нельзя!'},
                                 status=status.HTTP_400_BAD_REQUEST)
-            follow_data = {'user': user, 'author': author}
+            follow_data = {'user': user.id, 'author': author.id}
             serializer = FollowCreateSerializer(
                 data=follow_data,
                 context={'request': request, 'user': user}
             )
             serializer.is_valid(raise_exception=True)
             serializer.save()
+            TimelineEntry.objects.backfill(user.id, author)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         elif request.method == 'DELETE':
             delete_count, _ = Follow.objects.filter(user=user,
@@ -116,6 +236,7 @@ class FoodgramUserViewSet(UserViewSet):
                     {'errors': 'Вы уже отписались от этого автора!'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            TimelineEntry.objects.trim(user.id, id)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -124,6 +245,44 @@ class FoodgramReadOnlyModelViewSet(viewsets.ReadOnlyModelViewSet):
 
     permission_classes = (AllowAny,)
     pagination_class = None
+    version_name = None
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_conditional_response(self, handler, request, *args, **kwargs):
+        """Ответ 304, если данные у клиента актуальны."""
+        version = get_version(self.version_name)
+        headers = {
+            'ETag': f'"{self.version_name}-{version}"',
+            'Last-Modified': http_date(version // 10 ** 9),
+            'Cache-Control': 'public, no-cache',
+        }
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            not_modified = headers['ETag'] in (
+                tag.strip() for tag in if_none_match.split(',')
+            ) or if_none_match.strip() == '*'
+        else:
+            since = parse_http_date_safe(
+                request.headers.get('If-Modified-Since', '')
+            )
+            not_modified = since is not None and version // 10 ** 9 <= since
+        if not_modified:
+            return Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers=headers
+            )
+        response = handler(request, *args, **kwargs)
+        for header, value in headers.items():
+            response[header] = value
+        return response
 
 
 class TagViewSet(FoodgramReadOnlyModelViewSet):
@@ -131,6 +290,7 @@ class TagViewSet(FoodgramReadOnlyModelViewSet):
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    version_name = TAGS_VERSION
 
 
 class IngredientViewSet(FoodgramReadOnlyModelViewSet):
@@ -139,21 +299,43 @@ class IngredientViewSet(FoodgramReadOnlyModelViewSet):
     permission_classes = (IsAuthorOrReadOnlyPermission,)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (SearchFilter,)
-    search_fields = ('^name',)
+    version_name = INGREDIENTS_VERSION
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(self.__search, request)
+
+    def __search(self, request):
+        """Поиск по началу названия через индекс в памяти."""
+        name = request.query_params.get(api_settings.SEARCH_PARAM, '')
+        limit = request.query_params.get('limit', '')
+        return Response(ingredient_index.search(
+            name, int(limit) if limit.isdigit() else None
+        ))
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """ViewSet для управления рецептами."""
 
-    queryset = Recipe.objects.all().select_related(
-        'author'
-    ).prefetch_related(
-        'ingredients', 'tags'
-    )
+    queryset = Recipe.objects.with_related()
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
     permission_classes = (IsAuthorOrReadOnlyPermission,)
+    pagination_class = RecipePagination
+
+    def get_queryset(self):
+        """Рецепты с флагами избранного и списка покупок."""
+        queryset = super().get_queryset()
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset
+        return queryset.annotate(
+            is_favorited=Exists(Favourite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingList.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+        )
 
     def get_serializer_class(self):
         """Метод вызова определенного сериализатора."""
@@ -164,11 +346,89 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(methods=('GET',), detail=True, url_path='get-link')
     def get_link(self, request, pk=None):
         """Получение короткой ссылки рецепта."""
-        recipe = self.get_object()
-        short_link = request.build_absolute_uri(f'/{recipe.short_url}')
+        recipe = get_object_or_404(Recipe.objects.only('short_url'), pk=pk)
+        short_link = request.build_absolute_uri(f'/s/{recipe.short_url}/')
         data = {'short-link': short_link}
         return Response(data, status=status.HTTP_200_OK)
 
+    @action(methods=('GET',),
+            detail=False,
+            permission_classes=(IsAuthenticated,))
+    def feed(self, request):
+        """Лента рецептов авторов из подписок.
+
+        Рецепты обычных авторов раздаются в TimelineEntry при создании,
+        рецепты популярных авторов читаются из Recipe при запросе.
+        Страница собирается из двух коротких выборок по (pub_date, id)
+        с курсором, без подсчёта общего количества.
+        """
+        user = request.user
+        paginator = FeedCursorPagination()
+        position = paginator.get_position(request)
+        size = paginator.page_size + 1
+        # Записи автора, ставшего популярным, остаются в лентах:
+        # его рецепты читаются только из второй выборки.
+        entries = TimelineEntry.objects.filter(user=user).exclude(
+            author__followers_count__gte=settings.FEED_FANOUT_MAX_FOLLOWERS
+        )
+        popular = Recipe.objects.filter(author_id__in=Follow.objects.filter(
+            user=user,
+            author__followers_count__gte=settings.FEED_FANOUT_MAX_FOLLOWERS
+        ).values('author_id'))
+        filtered = self.filter_queryset(Recipe.objects.all())
+        if filtered.query.has_filters():
+            entries = entries.filter(recipe_id__in=filtered.values('id'))
+            popular = popular.filter(id__in=filtered.values('id'))
+        if position is not None:
+            pub_date, id = position
+            entries = entries.filter(
+                Q(pub_date__lt=pub_date)
+                | Q(pub_date=pub_date, recipe_id__lt=id)
+            )
+            popular = popular.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=id)
+            )
+        keys = paginator.paginate_keys([
+            *entries.order_by('-pub_date', '-recipe_id').values_list(
+                'pub_date', 'recipe_id'
+            )[:size],
+            *popular.order_by('-pub_date', '-id').values_list(
+                'pub_date', 'id'
+            )[:size],
+        ])
+        recipes = self.get_queryset().in_bulk([id for _, id in keys])
+        serializer = self.get_serializer(
+            [recipes[id] for _, id in keys if id in recipes], many=True
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(methods=('GET',), detail=True)
+    def similar(self, request, pk=None):
+        """Рецепты с похожим набором ингредиентов."""
+        recipe = self.get_object()
+        limit = request.query_params.get('limit', '')
+        limit = min(
+            int(limit) if limit.isdigit() else SIMILAR_RECIPES_LIMIT,
+            SIMILAR_RECIPES_MAX_LIMIT
+        )
+        found = similar_recipes.search(
+            recipe.id,
+            [item.ingredient_id for item in recipe.ingredient_list.all()],
+            limit
+        )
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _ in found]
+        )
+        similar_recipes.discard(
+            recipe_id for recipe_id, _ in found if recipe_id not in recipes
+        )
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id, _ in found
+             if recipe_id in recipes],
+            many=True
+        )
+        return Response(serializer.data)
+
     @action(methods=('POST', 'DELETE'),
             detail=True,
             permission_classes=(IsAuthenticated,),
@@ -179,8 +439,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
         recipe = get_object_or_404(Recipe, id=pk)
         if request.method == 'POST':
             return self.__create_obj_recipes(ShoppingListSerializer, request,
-                                             recipe)
-        return self.__delete_obj_recipes(request, ShoppingList, recipe)
+                                             recipe.id)
+        return self.__delete_obj_recipes(request, ShoppingList, recipe.id)
 
     @action(methods=('GET',),
             detail=False,
@@ -188,34 +448,30 @@ class RecipeViewSet(viewsets.ModelViewSet):
             url_path='download_shopping_cart',
             url_name='download_shopping_cart')
     def download_shopping_list(self, request):
-        """Загрузка списка покупок."""
-        ingredients = IngredientRecipe.objects.filter(
-            recipe__shopping_recipe__user=request.user
+        """Загрузка списка покупок в формате txt, csv или json."""
+        file_type = request.query_params.get('type', 'txt')
+        if file_type not in SHOPPING_LIST_FORMATS:
+            return Response(
+                {'errors': 'Допустимые форматы: '
+                           + ', '.join(SHOPPING_LIST_FORMATS)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        ingredients = ShoppingListTotal.objects.filter(
+            user=request.user
         ).values(
             'ingredient__name',
             'ingredient__measurement_unit',
-            'amount'
-        ).annotate(sum=Sum('amount')).order_by('ingredient__name')
-        shopping_list_file = self.create_shopping_list(ingredients)
-        response = HttpResponse(shopping_list_file,
-                                content_type='text/plain; charset=utf-8')
-        response['Content-Disposition'] = ('attachment; '
-                                           'filename="shopping_list.txt"')
+            total=F('amount'),
+        ).order_by('ingredient__name')
+        content_type, render = SHOPPING_LIST_FORMATS[file_type]
+        response = StreamingHttpResponse(
+            render(ingredients.iterator()), content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{file_type}"'
+        )
         return response
 
-    def create_shopping_list(self, ingredients):
-        """Создаёт список покупок из данных ингредиентов."""
-        if not ingredients:
-            return io.BytesIO()
-
-        shopping_list_buffer = io.BytesIO()
-        for ingredient in ingredients:
-            line = (f'{ingredient["ingredient__name"]} - {ingredient["sum"]} '
-                    f'({ingredient["ingredient__measurement_unit"]})\n')
-            shopping_list_buffer.write(line.encode('utf-8'))
-        shopping_list_buffer.seek(0)
-        return shopping_list_buffer
-
     @action(methods=('POST', 'DELETE'),
             detail=True,
             permission_classes=(IsAuthenticated,),
@@ -226,10 +482,73 @@ class RecipeViewSet(viewsets.ModelViewSet):
         recipe = get_object_or_404(Recipe, id=pk)
         if request.method == 'POST':
             return self.__create_obj_recipes(
-                FavouriteSerializer, request, recipe
+                FavouriteSerializer, request, recipe.id
             )
-        return self.__delete_obj_recipes(request, Favourite, recipe)
+        return self.__delete_obj_recipes(request, Favourite, recipe.id)
+
+    @action(methods=('POST',),
+            detail=False,
+            permission_classes=(IsAuthenticated,),
+            url_path='bulk_favorite',
+            url_name='bulk_favorite')
+    def bulk_favorite(self, request):
+        """Пакетное добавление/удаление рецептов в избранном."""
+        return self.__bulk_obj_recipes(request, Favourite)
 
+    @action(methods=('POST',),
+            detail=False,
+            permission_classes=(IsAuthenticated,),
+            url_path='bulk_shopping_cart',
+            url_name='bulk_shopping_cart')
+    def bulk_shopping_cart(self, request):
+        """Пакетное добавление/удаление рецептов в списке покупок."""
+        return self.__bulk_obj_recipes(request, ShoppingList)
+
+    @transaction.atomic
+    def __bulk_obj_recipes(self, request, model):
+        """Добавить и удалить несколько рецептов в одной транзакции."""
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        add = list(dict.fromkeys(serializer.validated_data['add']))
+        remove = list(dict.fromkeys(serializer.validated_data['remove']))
+        user = request.user
+        found = set(Recipe.objects.filter(
+            id__in=add + remove
+        ).values_list('id', flat=True))
+        present = set(model.objects.filter(
+            user=user, recipe_id__in=found
+        ).values_list('recipe_id', flat=True))
+        # Параллельный запрос может успеть добавить или удалить те же
+        # рецепты: счётчики меняются только по реально изменённым строкам.
+        added = model.objects.add_many(
+            user.id, [id for id in add if id in found and id not in present]
+        )
+        removed = model.objects.remove_many(
+            user.id, [id for id in remove if id in present]
+        )
+        if model is Favourite:
+            Recipe.objects.filter(id__in=added).update(
+                favorites_count=F('favorites_count') + 1
+            )
+        else:
+            ShoppingListTotal.objects.add_recipes(user.id, added)
+            ShoppingListTotal.objects.add_recipes(user.id, removed, sign=-1)
+        results = []
+        for id in add:
+            if id not in found:
+                result = 'not_found'
+            else:
+                result = 'added' if id in added else 'already_added'
+            results.append({'id': id, 'action': 'add', 'result': result})
+        for id in remove:
+            if id not in found:
+                result = 'not_found'
+            else:
+                result = 'removed' if id in removed else 'not_added'
+            results.append({'id': id, 'action': 'remove', 'result': result})
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    @transaction.atomic
     def __create_obj_recipes(self, serializer, request, pk):
         """Добавить."""
         data = {'user': request.user.id, 'recipe': int(pk)}
@@ -238,11 +557,14 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer_obj.save()
         return Response(serializer_obj.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def __delete_obj_recipes(self, request, model, pk):
         """Удалить."""
         delete_count, _ = model.objects.filter(
             user=request.user, recipe__id=pk
         ).delete()
+        if delete_count and model is ShoppingList:
+            ShoppingListTotal.objects.add_recipe(request.user.id, pk, sign=-1)
         if delete_count == 0:
             return Response({'errors': 'Рецепт уже удален'},
                             status=status.HTTP_400_BAD_REQUEST)
@@ -251,6 +573,16 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
 def redirect_to_full_recipe(request, short_url):
     """Перенаправление к полному рецепту."""
-    recipe = get_object_or_404(Recipe, short_url=short_url)
-    full_url = f'/recipes/{recipe.id}'
-    return HttpResponseRedirect(full_url)
+    recipe_id = short_links.resolve(short_url)
+    if recipe_id is None:
+        raise Http404('Короткая ссылка не найдена.')
+    return HttpResponseRedirect(f'/recipes/{recipe_id}')
+
+
+@api_view(['GET'])
+@permission_classes([IsMetricsScraperPermission])
+def metrics_view(request):
+    """Метрики запросов в формате Prometheus."""
+    return HttpResponse(
+        metrics.render(), content_type='text/plain; version=0.0.4'
+    )
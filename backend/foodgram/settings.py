@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -23,6 +24,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -31,9 +33,11 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
+    'jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,6 +78,49 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    }
+}
+
+RECIPE_CACHE = {
+    'alias': os.getenv('RECIPE_CACHE_ALIAS', default='default'),
+    'local_size': int(os.getenv('RECIPE_CACHE_LOCAL_SIZE', default=1024)),
+    'timeout': int(os.getenv('RECIPE_CACHE_TIMEOUT', default=60 * 60 * 24)),
+}
+
+IMAGE_MAX_SIZE = int(os.getenv('IMAGE_MAX_SIZE', default=5 * 1024 * 1024))
+
+IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', default=4096))
+
+JOBS_WORKERS = int(os.getenv('JOBS_WORKERS', default=2))
+
+JOBS_VISIBILITY_TIMEOUT = int(os.getenv('JOBS_VISIBILITY_TIMEOUT', default=300))
+
+JOBS_RETRY_DELAY = int(os.getenv('JOBS_RETRY_DELAY', default=10))
+
+JOBS_DONE_RETENTION = int(os.getenv('JOBS_DONE_RETENTION', default=24 * 60 * 60))
+
+SHORT_LINK_CACHE_SIZE = 10000
+
+SHORT_LINK_MISSING_CACHE_SIZE = 10000
+
+FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv('FEED_FANOUT_MAX_FOLLOWERS', default=10000))
+
+FEED_BACKFILL_SIZE = 100
+
+SIMILAR_RECIPES_REFRESH_INTERVAL = int(os.getenv('SIMILAR_RECIPES_REFRESH_INTERVAL', default=30))
+
+SIMILAR_RECIPES_MAX_DOCUMENT_FREQUENCY = 0.2
+
+METRICS_DIR = os.getenv('METRICS_DIR', default=os.path.join(tempfile.gettempdir(), 'foodgram-metrics'))
+
+METRICS_FLUSH_INTERVAL = int(os.getenv('METRICS_FLUSH_INTERVAL', default=5))
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.'
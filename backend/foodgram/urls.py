@@ -1,14 +1,17 @@
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 
 from api.views import redirect_to_full_recipe
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls', namespace='api')),
-    path('<str:short_url>/', redirect_to_full_recipe, name='short_url'),
+    re_path(r'^s/(?P<short_url>[0-9A-Za-z]+)/?$', redirect_to_full_recipe,
+            name='short_url'),
+    re_path(r'^(?P<short_url>[0-9A-Za-z]+)/$', redirect_to_full_recipe,
+            name='legacy_short_url'),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,16 @@
+from django.contrib import admin
+
+from jobs.models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Фоновые задачи."""
+
+    list_display = (
+        'id', 'name', 'status', 'attempts', 'run_at', 'created_at'
+    )
+    list_display_links = ('id', 'name')
+    list_filter = ('status', 'name')
+    readonly_fields = ('last_error',)
+    empty_value_display = 'Поле не заполнено'
@@ -0,0 +1,74 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils.module_loading import autodiscover_modules
+
+from jobs.models import Job
+from jobs.queue import TASKS
+from recipes.versions import check_shared_cache
+
+logger = logging.getLogger(__name__)
+
+PURGE_INTERVAL = 60
+
+
+def run_job(job):
+    """Выполнение одной задачи в потоке пула."""
+    try:
+        if job.attempts > job.max_attempts:
+            raise RuntimeError('Превышено число попыток.')
+        TASKS[job.name](**job.payload)
+    except Exception as error:
+        logger.exception('Job %s (%s) failed', job.id, job.name)
+        job.mark_failed(error)
+    else:
+        job.mark_done()
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    """Обработчик фоновых задач."""
+
+    help = 'Обработка фоновых задач из базы данных.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.JOBS_WORKERS
+        )
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить готовые задачи и завершиться.'
+        )
+
+    def handle(self, *args, **options):
+        """Цикл захвата и выполнения задач."""
+        try:
+            check_shared_cache()
+        except ImproperlyConfigured as error:
+            raise CommandError(error)
+        autodiscover_modules('tasks')
+        workers = options['workers']
+        purged_at = None
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                if (
+                    purged_at is None
+                    or time.monotonic() - purged_at > PURGE_INTERVAL
+                ):
+                    Job.objects.purge(settings.JOBS_DONE_RETENTION)
+                    purged_at = time.monotonic()
+                jobs = Job.objects.claim(workers * 2)
+                if jobs:
+                    list(pool.map(run_job, jobs))
+                    continue
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
@@ -0,0 +1,115 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+NAME_MAX_LENGTH = 256
+STATUS_MAX_LENGTH = 16
+
+
+class JobManager(models.Manager):
+    """Выборка задач для обработки."""
+
+    @transaction.atomic
+    def claim(self, limit):
+        """Захват готовых задач с таймаутом видимости."""
+        now = timezone.now()
+        jobs = list(
+            self.select_for_update(skip_locked=True).filter(
+                Q(status=Job.PENDING, run_at__lte=now)
+                | Q(status=Job.RUNNING, locked_until__lte=now)
+            ).order_by('run_at')[:limit]
+        )
+        locked_until = now + timedelta(
+            seconds=settings.JOBS_VISIBILITY_TIMEOUT
+        )
+        self.filter(id__in=[job.id for job in jobs]).update(
+            status=Job.RUNNING,
+            locked_until=locked_until,
+            attempts=F('attempts') + 1
+        )
+        for job in jobs:
+            job.status = Job.RUNNING
+            job.locked_until = locked_until
+            job.attempts += 1
+        return jobs
+
+    def purge(self, older_than):
+        """Удаление выполненных задач, запланированных раньше срока."""
+        return self.filter(
+            status=Job.DONE,
+            run_at__lt=timezone.now() - timedelta(seconds=older_than)
+        ).delete()[0]
+
+
+class Job(models.Model):
+    """Модель фоновой задачи."""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'Ожидает'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField('Задача', max_length=NAME_MAX_LENGTH)
+    payload = models.JSONField('Аргументы', default=dict)
+    status = models.CharField(
+        'Статус',
+        max_length=STATUS_MAX_LENGTH,
+        choices=STATUSES,
+        default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField(
+        'Максимум попыток', default=5
+    )
+    run_at = models.DateTimeField('Запустить после', default=timezone.now)
+    locked_until = models.DateTimeField(
+        'Заблокирована до', null=True, blank=True
+    )
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created_at = models.DateTimeField('Создана', auto_now_add=True)
+
+    objects = JobManager()
+
+    class Meta:
+        ordering = ('-created_at',)
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = (
+            models.Index(
+                fields=('status', 'run_at'), name='job_status_run_at_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
+
+    def mark_done(self):
+        """Задача выполнена."""
+        Job.objects.filter(pk=self.pk).update(
+            status=Job.DONE, locked_until=None
+        )
+
+    def mark_failed(self, error):
+        """Повтор с экспоненциальной задержкой или окончательная ошибка."""
+        if self.attempts >= self.max_attempts:
+            status, run_at = Job.FAILED, self.run_at
+        else:
+            status = Job.PENDING
+            run_at = timezone.now() + timedelta(
+                seconds=settings.JOBS_RETRY_DELAY * 2 ** (self.attempts - 1)
+            )
+        Job.objects.filter(pk=self.pk).update(
+            status=status,
+            run_at=run_at,
+            locked_until=None,
+            last_error=repr(error)
+        )
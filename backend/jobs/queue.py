@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from jobs.models import Job
+
+TASKS = {}
+
+
+def task(func):
+    """Регистрация функции как фоновой задачи."""
+    name = f'{func.__module__}.{func.__name__}'
+    TASKS[name] = func
+    func.delay = lambda **kwargs: enqueue(name, **kwargs)
+    func.delay_many = lambda payloads: enqueue_many(name, payloads)
+    return func
+
+
+def enqueue(name, countdown=0, **kwargs):
+    """Постановка задачи в очередь в текущей транзакции."""
+    return Job.objects.create(
+        name=name,
+        payload=kwargs,
+        run_at=timezone.now() + timedelta(seconds=countdown)
+    )
+
+
+def enqueue_many(name, payloads, countdown=0):
+    """Постановка пачки однотипных задач одним запросом."""
+    run_at = timezone.now() + timedelta(seconds=countdown)
+    return Job.objects.bulk_create(
+        Job(name=name, payload=payload, run_at=run_at)
+        for payload in payloads
+    )
@@ -0,0 +1,85 @@
+import io
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api.tasks import build_recipe_images
+from jobs.models import Job
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+class JobsTests(TestCase):
+    """Фоновые задачи и их обработчик."""
+
+    def test_task_for_deleted_record_does_nothing(self):
+        build_recipe_images(recipe_id=0)
+
+    def test_old_done_jobs_are_purged(self):
+        old = timezone.now() - timedelta(minutes=5)
+        Job.objects.create(name='done', status=Job.DONE, run_at=old)
+        failed = Job.objects.create(
+            name='failed', status=Job.FAILED, run_at=old
+        )
+        recent = Job.objects.create(name='recent', status=Job.DONE)
+        self.assertEqual(Job.objects.purge(60), 1)
+        self.assertCountEqual(Job.objects.all(), [failed, recent])
+
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+        }
+    })
+    def test_process_local_cache_is_rejected(self):
+        with self.assertRaises(CommandError):
+            call_command('run_jobs', '--once')
+
+    def test_missing_image_file_gives_no_derivatives(self):
+        recipe = Recipe.objects.create(
+            author=User.objects.create_user(
+                username='author', email='author@example.com',
+                first_name='Author', last_name='Author', password='password'
+            ),
+            name='Рецепт', text='Текст', cooking_time=1,
+            image='recipes/missing.png'
+        )
+        build_recipe_images(recipe_id=recipe.id)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_derivatives, {})
+
+    def test_backfill_enqueues_records_without_derivatives(self):
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Author', last_name='Author', password='password'
+        )
+        User.objects.filter(pk=author.pk).update(avatar='users/author.png')
+        recipes = [
+            Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='Текст',
+                cooking_time=1, image='recipes/test.png'
+            )
+            for number in range(3)
+        ]
+        Recipe.objects.filter(pk=recipes[0].pk).update(
+            image_derivatives={'card': 'recipes/derivatives/test_card.png'}
+        )
+        for _ in range(2):
+            call_command(
+                'build_image_derivatives', '--batch-size', '1',
+                stdout=io.StringIO()
+            )
+        self.assertCountEqual(
+            Job.objects.values_list('name', 'payload'),
+            [
+                *(
+                    ('api.tasks.build_recipe_images', {'recipe_id': recipe.id})
+                    for recipe in recipes[1:]
+                ),
+                ('api.tasks.build_avatar_images', {'user_id': author.id}),
+            ]
+        )
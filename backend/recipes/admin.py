@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 from recipes.models import (Tag, Ingredient, Favourite, Recipe,
-                            IngredientRecipe, ShoppingList)
+                            IngredientRecipe, ShoppingList, ShoppingListTotal)
 
 
 @admin.register(Tag)
@@ -42,7 +42,8 @@ class TagsInLine(admin.StackedInline):
 class RecipeAdmin(admin.ModelAdmin):
     """Рецепты."""
 
-    list_display = ('id', 'name', 'author', 'pub_date', 'text')
+    list_display = ('id', 'name', 'author', 'pub_date', 'text',
+                    'favorites_count')
     list_display_links = ('id', 'name', 'author')
     search_fields = ('name', 'author')
     list_filter = ('tags',)
@@ -55,6 +56,21 @@ class RecipeAdmin(admin.ModelAdmin):
                     .prefetch_related('tags', 'ingredients'))
         return queryset
 
+    def save_related(self, request, form, formsets, change):
+        """Перенос изменений ингредиентов в суммы списков покупок."""
+        recipe = form.instance
+        before = ShoppingListTotal.objects.get_changes((recipe.id,))
+        super().save_related(request, form, formsets, change)
+        after = ShoppingListTotal.objects.get_changes((recipe.id,))
+        ShoppingListTotal.objects.apply_changes(
+            recipe.shopping_recipe.values_list('user_id', flat=True),
+            {
+                ingredient_id:
+                    after.get(ingredient_id, 0) - before.get(ingredient_id, 0)
+                for ingredient_id in before.keys() | after.keys()
+            }
+        )
+
 
 class IngredientRecipeAdmin(admin.ModelAdmin):
     """Ингредиенты в рецептах."""
@@ -87,3 +103,31 @@ class ShoppingListAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'recipe')
     list_display_links = ('id', 'user')
     empty_value_display = 'Поле не заполнено'
+
+    def save_model(self, request, obj, form, change):
+        """Пересчёт сумм списков покупок при изменении записи."""
+        if change:
+            old = ShoppingList.objects.get(pk=obj.pk)
+            ShoppingListTotal.objects.add_recipe(
+                old.user_id, old.recipe_id, sign=-1
+            )
+        super().save_model(request, obj, form, change)
+        ShoppingListTotal.objects.add_recipe(obj.user_id, obj.recipe_id)
+
+    def delete_model(self, request, obj):
+        """Вычитание рецепта из сумм списка покупок."""
+        ShoppingListTotal.objects.add_recipe(
+            obj.user_id, obj.recipe_id, sign=-1
+        )
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        """Вычитание рецептов из сумм при массовом удалении."""
+        recipes_by_user = {}
+        for user_id, recipe_id in queryset.values_list('user_id', 'recipe_id'):
+            recipes_by_user.setdefault(user_id, []).append(recipe_id)
+        for user_id, recipe_ids in recipes_by_user.items():
+            ShoppingListTotal.objects.add_recipes(
+                user_id, recipe_ids, sign=-1
+            )
+        super().delete_queryset(request, queryset)
@@ -7,3 +7,7 @@ class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
     verbose_name = 'Рецепты'
+
+    def ready(self):
+        import recipes.checks  # noqa: F401
+        import recipes.signals  # noqa: F401
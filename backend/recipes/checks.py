@@ -0,0 +1,19 @@
+from django.core.checks import Warning, register
+from django.core.exceptions import ImproperlyConfigured
+
+from recipes.versions import check_shared_cache
+
+
+@register(deploy=True)
+def shared_cache_check(app_configs, **kwargs):
+    """Версии данных должны храниться в кэше, общем для всех процессов."""
+    try:
+        check_shared_cache()
+    except ImproperlyConfigured as error:
+        return [Warning(
+            str(error),
+            hint='Воркеры gunicorn, run_jobs и dataloads будут отдавать '
+                 'устаревшие данные.',
+            id='recipes.W001',
+        )]
+    return []
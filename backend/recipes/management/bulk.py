@@ -0,0 +1,27 @@
+import csv
+import io
+
+from django.db import connection
+
+
+def insert_rows(model, columns, rows, use_copy, batch_size=None):
+    """Вставка строк через COPY или bulk_create."""
+    if not rows:
+        return
+    if not use_copy:
+        model.objects.bulk_create(
+            (model(**dict(zip(columns, row))) for row in rows),
+            batch_size=batch_size
+        )
+        return
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {quote(model._meta.db_table)} '
+            f'({", ".join(quote(column) for column in columns)}) '
+            'FROM STDIN WITH (FORMAT csv)',
+            buffer
+        )
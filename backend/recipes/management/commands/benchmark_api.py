@@ -0,0 +1,326 @@
+import base64
+import io
+import json
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.db.models import Count
+from django.test import Client, override_settings
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from api.tasks import build_recipe_images, fan_out_recipe
+from jobs.models import Job
+from recipes.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, rank):
+    """Перцентиль по методу ближайшего ранга."""
+    if not values:
+        return None
+    index = max(0, -(-len(values) * rank // 100) - 1)
+    return values[index]
+
+
+def make_image():
+    """Небольшое изображение в base64 для создания рецептов."""
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (200, 120, 40)).save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+class Command(BaseCommand):
+    """Нагрузочный тест горячих эндпоинтов API."""
+
+    help = (
+        'Замер пропускной способности и задержек p50/p95/p99 API. '
+        'Изображения пишутся во временный MEDIA_ROOT, созданные рецепты '
+        'и их фоновые задачи удаляются после прогона.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument(
+            '--user',
+            help='Email пользователя; по умолчанию с наибольшим числом '
+                 'подписок.'
+        )
+        parser.add_argument('--host', default='localhost')
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            help='Запустить только указанные сценарии.'
+        )
+        parser.add_argument('--output', help='Файл JSON для отчёта.')
+        parser.add_argument(
+            '--baseline',
+            help='Отчёт предыдущего прогона для сравнения.'
+        )
+
+    def handle(self, *args, **options):
+        """Прогон сценариев и запись отчёта."""
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError(
+                'Число запросов и потоков должно быть не меньше 1.'
+            )
+        if options['warmup'] < 0:
+            raise CommandError('Число прогревочных запросов не меньше 0.')
+        self.host = options['host']
+        user = self.__get_user(options['user'])
+        self.token = Token.objects.get_or_create(user=user)[0].key
+        self.created = []
+        scenarios = self.__get_scenarios(user)
+        if options['scenario']:
+            unknown = set(options['scenario']) - scenarios.keys()
+            if unknown:
+                raise CommandError(
+                    f'Неизвестные сценарии: {", ".join(sorted(unknown))}'
+                )
+            scenarios = {
+                name: scenarios[name] for name in options['scenario']
+            }
+        results = {}
+        last_job_id = Job.objects.order_by('-id').values_list(
+            'id', flat=True
+        ).first() or 0
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root):
+            try:
+                for name, (method, make_request) in scenarios.items():
+                    results[name] = self.__run(
+                        method, make_request, options['requests'],
+                        options['concurrency'], options['warmup']
+                    )
+                    self.__print(name, results[name])
+            finally:
+                Recipe.objects.filter(id__in=self.created).delete()
+                Job.objects.filter(
+                    id__gt=last_job_id,
+                    name__in=[
+                        f'{task.__module__}.{task.__name__}'
+                        for task in (build_recipe_images, fan_out_recipe)
+                    ],
+                    payload__recipe_id__in=self.created
+                ).delete()
+        report = {
+            'commit': self.__get_commit(),
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'recipes': Recipe.objects.count(),
+            'scenarios': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            self.__compare(options['baseline'], results)
+
+    def __get_user(self, email):
+        if email:
+            try:
+                return User.objects.get(email=email)
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь {email} не найден.')
+        user = User.objects.annotate(
+            follows=Count('follower')
+        ).order_by('-follows', 'id').first()
+        if user is None:
+            raise CommandError('В базе нет пользователей.')
+        return user
+
+    def __get_scenarios(self, user):
+        """Сценарии: имя -> (метод, функция параметров запроса)."""
+        tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+        tag_query = '&'.join(f'tags={slug}' for slug in tags)
+        ingredient_ids = list(
+            Ingredient.objects.values_list('id', flat=True)[:3]
+        )
+        tag_ids = list(Tag.objects.values_list('id', flat=True)[:2])
+        recipe_id = Recipe.objects.order_by('-id').values_list(
+            'id', flat=True
+        ).first()
+        prefixes = [
+            name[:2] for name in Ingredient.objects.order_by('?').values_list(
+                'name', flat=True
+            )[:50]
+        ] or ['а']
+        image = make_image()
+
+        def recipe_payload(index):
+            return {
+                'ingredients': [
+                    {'id': id, 'amount': index % 50 + 1}
+                    for id in ingredient_ids
+                ],
+                'tags': tag_ids,
+                'name': f'Бенчмарк {index}',
+                'image': image,
+                'text': 'Рецепт для нагрузочного теста.',
+                'cooking_time': index % 120 + 1,
+            }
+
+        def get(path):
+            return lambda index: (path, None)
+
+        scenarios = {
+            'recipes-list': ('get', get('/api/recipes/')),
+            'recipes-list-tags': (
+                'get', get(f'/api/recipes/?{tag_query}')
+            ),
+            'recipes-list-author': (
+                'get', get(f'/api/recipes/?author={user.id}')
+            ),
+            'recipes-list-favorited': (
+                'get', get('/api/recipes/?is_favorited=1')
+            ),
+            'recipes-list-shopping-cart': (
+                'get', get('/api/recipes/?is_in_shopping_cart=1')
+            ),
+            'recipes-list-tags-favorited': (
+                'get', get(f'/api/recipes/?{tag_query}&is_favorited=1')
+            ),
+            'recipes-list-search': (
+                'get', get(f'/api/recipes/?search={quote("суп")}')
+            ),
+            'recipes-list-cursor': (
+                'get', get('/api/recipes/?cursor=&limit=6')
+            ),
+            'recipes-feed': ('get', get('/api/recipes/feed/')),
+            'users-subscriptions': (
+                'get', get('/api/users/subscriptions/?recipes_limit=3')
+            ),
+            'ingredients-autocomplete': (
+                'get', lambda index: (
+                    '/api/ingredients/?name='
+                    + quote(prefixes[index % len(prefixes)]),
+                    None
+                )
+            ),
+            'recipes-download-shopping-cart': (
+                'get', get('/api/recipes/download_shopping_cart/')
+            ),
+        }
+        if recipe_id is not None:
+            scenarios['recipes-detail'] = (
+                'get', get(f'/api/recipes/{recipe_id}/')
+            )
+            scenarios['recipes-similar'] = (
+                'get', get(f'/api/recipes/{recipe_id}/similar/')
+            )
+        self.create_request = lambda index: (
+            '/api/recipes/', recipe_payload(index)
+        )
+        if ingredient_ids and tag_ids:
+            scenarios['recipes-create'] = ('post', self.create_request)
+            scenarios['recipes-update'] = (
+                'patch', lambda index: (
+                    f'/api/recipes/{self.created[index % len(self.created)]}/',
+                    recipe_payload(index)
+                )
+            )
+        return scenarios
+
+    def __request(self, client, method, make_request, index):
+        path, data = make_request(index)
+        started = time.perf_counter()
+        response = getattr(client, method)(
+            path, data, content_type='application/json'
+        ) if data is not None else getattr(client, method)(path)
+        if getattr(response, 'streaming', False):
+            for _ in response.streaming_content:
+                pass
+        elapsed = time.perf_counter() - started
+        if method == 'post' and response.status_code == 201:
+            self.created.append(response.json()['id'])
+        return elapsed, response.status_code
+
+    def __worker(self, method, make_request, indexes):
+        client = Client(
+            HTTP_AUTHORIZATION=f'Token {self.token}', HTTP_HOST=self.host
+        )
+        try:
+            return [
+                self.__request(client, method, make_request, index)
+                for index in indexes
+            ]
+        finally:
+            close_old_connections()
+
+    def __run(self, method, make_request, requests, concurrency, warmup):
+        """Прогон одного сценария в нескольких потоках."""
+        if method == 'patch' and not self.created:
+            self.__worker('post', self.create_request, range(1))
+        self.__worker(method, make_request, range(warmup))
+        chunks = [range(requests)[i::concurrency] for i in range(concurrency)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            samples = [
+                sample
+                for chunk in executor.map(
+                    lambda chunk: self.__worker(method, make_request, chunk),
+                    chunks
+                )
+                for sample in chunk
+            ]
+        duration = time.perf_counter() - started
+        latencies = sorted(elapsed for elapsed, _ in samples)
+        errors = sum(1 for _, status in samples if status >= 400)
+        result = {
+            'requests': len(samples),
+            'errors': errors,
+            'throughput': len(samples) / duration if duration else 0,
+            'mean_ms': sum(latencies) / len(latencies) * 1000,
+        }
+        for rank in PERCENTILES:
+            result[f'p{rank}_ms'] = percentile(latencies, rank) * 1000
+        return result
+
+    def __print(self, name, result):
+        self.stdout.write(
+            f'{name:34} {result["throughput"]:8.1f} rps  '
+            + '  '.join(
+                f'p{rank} {result[f"p{rank}_ms"]:7.1f} мс'
+                for rank in PERCENTILES
+            )
+            + (f'  ошибок: {result["errors"]}' if result['errors'] else '')
+        )
+
+    def __compare(self, path, results):
+        """Сравнение p95 и пропускной способности с прошлым отчётом."""
+        with open(path, encoding='utf-8') as file:
+            baseline = json.load(file)['scenarios']
+        for name, result in results.items():
+            previous = baseline.get(name)
+            if previous is None:
+                continue
+            self.stdout.write(
+                f'{name:34} p95 {previous["p95_ms"]:7.1f} -> '
+                f'{result["p95_ms"]:7.1f} мс '
+                f'({(result["p95_ms"] / previous["p95_ms"] - 1) * 100:+.0f}%)'
+                f', rps {previous["throughput"]:.1f} -> '
+                f'{result["throughput"]:.1f}'
+            )
+
+    def __get_commit(self):
+        try:
+            return subprocess.run(
+                ('git', 'rev-parse', 'HEAD'), capture_output=True,
+                text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,78 @@
+import logging
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from api.tasks import build_avatar_images, build_recipe_images
+from jobs.models import Job
+from recipes.models import Recipe
+from users.models import DEFAULT_AVATAR
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """Постановка в очередь построения уменьшенных копий изображений."""
+
+    help = (
+        'Задачи построения копий изображений для рецептов и аватаров, '
+        'у которых копий ещё нет: записи, созданные до появления копий, '
+        'загруженные import_recipes и seed_synthetic.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """Постановка задач пачками по возрастанию первичного ключа."""
+        if options['batch_size'] < 1:
+            raise CommandError('Размер пачки должен быть не меньше 1.')
+        self.batch_size = options['batch_size']
+        for queryset, task, argument in (
+            (
+                Recipe.objects.exclude(image='').filter(
+                    image_derivatives={}
+                ),
+                build_recipe_images,
+                'recipe_id',
+            ),
+            (
+                User.objects.exclude(
+                    Q(avatar__isnull=True) | Q(avatar='')
+                    | Q(avatar=DEFAULT_AVATAR)
+                ).filter(avatar_derivatives={}),
+                build_avatar_images,
+                'user_id',
+            ),
+        ):
+            model = queryset.model
+            enqueued = self.__enqueue(queryset, task, argument)
+            logger.info('%s: enqueued %s', model.__name__, enqueued)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: '
+                f'поставлено задач {enqueued}'
+            )
+
+    def __enqueue(self, queryset, task, argument):
+        """Задачи для записей без копий, кроме уже ждущих в очереди."""
+        name = f'{task.__module__}.{task.__name__}'
+        queryset = queryset.order_by('pk')
+        enqueued = last_id = 0
+        while True:
+            ids = list(queryset.filter(pk__gt=last_id).values_list(
+                'pk', flat=True
+            )[:self.batch_size])
+            if not ids:
+                return enqueued
+            last_id = ids[-1]
+            waiting = set(Job.objects.filter(
+                name=name,
+                status__in=(Job.PENDING, Job.RUNNING),
+                **{f'payload__{argument}__in': ids}
+            ).values_list(f'payload__{argument}', flat=True))
+            enqueued += len(task.delay_many(
+                {argument: id} for id in ids if id not in waiting
+            ))
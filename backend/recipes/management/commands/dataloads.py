@@ -1,31 +1,166 @@
-import os
+import json
 import logging
+import os
+import time
+from collections import defaultdict
 from csv import DictReader
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
 from recipes.models import Ingredient
+from recipes.versions import (INGREDIENTS_VERSION, bump_version,
+                              check_shared_cache)
 
 logger = logging.getLogger(__name__)
 
+READ_BLOCK_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    """Строки csv-файла без заголовка."""
+    yield from DictReader(file, fieldnames=('name', 'measurement_unit',))
+
+
+def read_json(file):
+    """Объекты json-массива по одному, без чтения файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n[,':
+            position += 1
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        try:
+            row, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                if buffer[position:].strip():
+                    raise
+                return
+            block = file.read(READ_BLOCK_SIZE)
+            eof = not block
+            buffer = buffer[position:] + block
+            position = 0
+            continue
+        yield row
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
 
 class Command(BaseCommand):
     """Загрузка ингредиентов."""
 
     help = 'Загрузка ингредиентов.'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=os.path.join(settings.BASE_DIR, 'data/ingredients.csv'),
+            help='Файл csv или json с ингредиентами.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Показать изменения, не записывая их в базу.'
+        )
+
     def handle(self, *args, **options):
-        """Загрузка csv-файлов."""
-        path = os.path.join(settings.BASE_DIR, 'data/ingredients.csv')
+        """Загрузка csv- или json-файла порциями с обновлением."""
+        path = options['path']
+        reader = READERS.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы csv и json.')
+        self.dry_run = options['dry_run']
+        if not self.dry_run:
+            try:
+                check_shared_cache()
+            except ImproperlyConfigured as error:
+                raise CommandError(error)
+        self.counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+        self.loaded_names = set()
+        started = time.monotonic()
         with open(path, 'r', encoding='utf-8') as file:
-            reader = DictReader(
-                file, fieldnames=('name', 'measurement_unit',)
-            )
-            ingredients = [
-                Ingredient(
-                    name=row['name'], measurement_unit=row['measurement_unit']
-                )
-                for row in reader
-            ]
-            Ingredient.objects.bulk_create(ingredients, ignore_conflicts=True)
-            logger.info('Data is load.')
+            for batch in self.__batches(reader(file), options['batch_size']):
+                self.__upsert(batch)
+        if not self.dry_run and (
+            self.counts['inserted'] or self.counts['updated']
+        ):
+            bump_version(INGREDIENTS_VERSION)
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            'Добавлено: {inserted}, обновлено: {updated}, '
+            'без изменений: {skipped}'.format(**self.counts)
+            + f' ({elapsed:.2f} с)'
+        )
+        logger.info('Data is load.')
+
+    def __batches(self, rows, batch_size):
+        """Порции строк; одноимённые соседние строки не разделяются."""
+        batch = []
+        for row in rows:
+            if len(batch) >= batch_size and row['name'] != batch[-1]['name']:
+                yield batch
+                batch = []
+            batch.append(row)
+        if batch:
+            yield batch
+
+    def __upsert(self, batch):
+        """Добавление новых ингредиентов и обновление единиц измерения.
+
+        Одноимённые строки из разных порций не обновляют друг друга:
+        имена уже загруженных строк запоминаются в loaded_names.
+        """
+        existing = defaultdict(list)
+        for ingredient in Ingredient.objects.filter(
+            name__in={row['name'] for row in batch}
+        ):
+            existing[ingredient.name].append(ingredient)
+        name_counts = defaultdict(int)
+        for row in batch:
+            name_counts[row['name']] += 1
+        to_create = []
+        to_update = []
+        seen = set()
+        for row in batch:
+            name, unit = row['name'], row['measurement_unit']
+            if (name, unit) in seen:
+                continue
+            seen.add((name, unit))
+            ingredients = existing[name]
+            if any(item.measurement_unit == unit for item in ingredients):
+                self.counts['skipped'] += 1
+                continue
+            if name in self.loaded_names:
+                # Ингредиент уже встречался в файле с другой единицей:
+                # обе единицы сохраняются, а не перезаписывают друг друга.
+                self.stdout.write(self.style.WARNING(
+                    f'! {name}: повтор с единицей {unit}, добавлен отдельно'
+                ))
+            elif len(ingredients) == 1 and name_counts[name] == 1:
+                ingredient = ingredients[0]
+                if self.dry_run:
+                    self.stdout.write(
+                        f'~ {name}: {ingredient.measurement_unit} -> {unit}'
+                    )
+                ingredient.measurement_unit = unit
+                to_update.append(ingredient)
+                continue
+            if self.dry_run:
+                self.stdout.write(f'+ {name} ({unit})')
+            to_create.append(Ingredient(name=name, measurement_unit=unit))
+        self.loaded_names.update(name_counts)
+        self.counts['inserted'] += len(to_create)
+        self.counts['updated'] += len(to_update)
+        if self.dry_run:
+            return
+        Ingredient.objects.bulk_create(to_create, ignore_conflicts=True)
+        Ingredient.objects.bulk_update(to_update, ('measurement_unit',))
@@ -0,0 +1,79 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Выгрузка рецептов в JSONL."""
+
+    help = 'Потоковая выгрузка рецептов с ингредиентами и тегами в JSONL.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='Файл для выгрузки, по умолчанию stdout.'
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """Выгрузка рецептов порциями по возрастанию id."""
+        output = options['output']
+        file = (
+            sys.stdout if output == '-'
+            else open(output, 'w', encoding='utf-8')
+        )
+        started = time.monotonic()
+        exported = 0
+        try:
+            for recipe in self.__iter_recipes(options['chunk_size']):
+                file.write(json.dumps(
+                    self.__serialize(recipe), ensure_ascii=False
+                ) + '\n')
+                exported += 1
+        finally:
+            if file is not sys.stdout:
+                file.close()
+        elapsed = time.monotonic() - started
+        self.stderr.write(
+            f'Выгружено рецептов: {exported} за {elapsed:.1f} с '
+            f'({exported / elapsed if elapsed else 0:.0f} рецептов/с)'
+        )
+
+    def __iter_recipes(self, chunk_size):
+        """Рецепты порциями с подгрузкой связанных данных."""
+        last_id = 0
+        while True:
+            chunk = list(
+                Recipe.objects.filter(id__gt=last_id).order_by('id')
+                .select_related('author')
+                .prefetch_related('tags', 'ingredient_list__ingredient')
+                [:chunk_size]
+            )
+            if not chunk:
+                return
+            yield from chunk
+            last_id = chunk[-1].id
+
+    def __serialize(self, recipe):
+        return {
+            'author': recipe.author.email,
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'image': recipe.image.name,
+            'pub_date': recipe.pub_date.isoformat(),
+            'tags': [tag.slug for tag in recipe.tags.all()],
+            'ingredients': [
+                {
+                    'name': item.ingredient.name,
+                    'measurement_unit': item.ingredient.measurement_unit,
+                    'amount': item.amount,
+                }
+                for item in recipe.ingredient_list.all()
+            ],
+        }
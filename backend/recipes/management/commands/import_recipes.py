@@ -0,0 +1,204 @@
+import io
+import json
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from recipes.management.bulk import insert_rows
+from recipes.models import (SHORT_URL_MAX_LENGTH, Ingredient,
+                            IngredientRecipe, Recipe, Tag, TimelineEntry,
+                            encode_short_url)
+
+User = get_user_model()
+
+# Сколько ингредиентов не из справочника перечислить в отчёте.
+MISSING_INGREDIENTS_SHOWN = 10
+
+
+class Command(BaseCommand):
+    """Загрузка рецептов из JSONL."""
+
+    help = (
+        'Потоковая загрузка рецептов из JSONL порциями. Рецепты, уже '
+        'загруженные с тем же автором, названием и датой, пропускаются, '
+        'ингредиенты не из справочника не загружаются и выводятся в отчёте.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл JSONL с рецептами.')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY даже в PostgreSQL.'
+        )
+
+    def handle(self, *args, **options):
+        """Загрузка файла порциями фиксированного размера."""
+        self.use_copy = (
+            connection.vendor == 'postgresql' and not options['no_copy']
+        )
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.ingredients = {
+            (name, measurement_unit): id
+            for id, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        }
+        self.authors = {}
+        self.imported = self.skipped = self.duplicates = 0
+        self.missing_ingredients = {}
+        started = time.monotonic()
+        chunk = []
+        with open(options['path'], encoding='utf-8') as file:
+            for line in file:
+                if line.strip():
+                    chunk.append(json.loads(line))
+                if len(chunk) >= options['chunk_size']:
+                    self.__import_chunk(chunk)
+                    chunk = []
+                    self.__report(started)
+        if chunk:
+            self.__import_chunk(chunk)
+        call_command('reconcile_counters', stdout=io.StringIO())
+        call_command('build_image_derivatives', stdout=io.StringIO())
+        self.__report(started)
+        self.__report_missing_ingredients()
+
+    def __report(self, started):
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'Загружено: {self.imported}, пропущено: {self.skipped}, '
+            f'повторов: {self.duplicates}, '
+            f'ингредиентов не из справочника: '
+            f'{sum(self.missing_ingredients.values())}, '
+            f'{elapsed:.1f} с '
+            f'({self.imported / elapsed if elapsed else 0:.0f} рецептов/с)'
+        )
+
+    def __report_missing_ingredients(self):
+        if not self.missing_ingredients:
+            return
+        missing = sorted(
+            self.missing_ingredients.items(), key=lambda item: -item[1]
+        )
+        self.stdout.write(self.style.WARNING(
+            'Ингредиенты не найдены в справочнике и не загружены: '
+            + ', '.join(
+                f'{name} ({measurement_unit}) — {count}'
+                for (name, measurement_unit), count
+                in missing[:MISSING_INGREDIENTS_SHOWN]
+            )
+            + (
+                f' и ещё {len(missing) - MISSING_INGREDIENTS_SHOWN}'
+                if len(missing) > MISSING_INGREDIENTS_SHOWN else ''
+            )
+        ))
+
+    @transaction.atomic
+    def __import_chunk(self, records):
+        """Загрузка одной порции рецептов."""
+        emails = {record['author'] for record in records} - self.authors.keys()
+        self.authors.update(
+            User.objects.filter(email__in=emails).values_list('email', 'id')
+        )
+        existing = self.__get_existing(records)
+        recipes = []
+        for record in records:
+            author_id = self.authors.get(record['author'])
+            if author_id is None:
+                self.skipped += 1
+                continue
+            record['pub_date'] = self.__parse_date(record.get('pub_date'))
+            key = (author_id, record['name'])
+            if (
+                (*key, record['pub_date']) in existing
+                or record['pub_date'] is None and key in existing
+            ):
+                self.duplicates += 1
+                continue
+            existing.update((key, (*key, record['pub_date'])))
+            recipe = Recipe(
+                author_id=author_id,
+                name=record['name'],
+                text=record['text'],
+                cooking_time=record['cooking_time'],
+                image=record['image'],
+                short_url=uuid.uuid4().hex[:SHORT_URL_MAX_LENGTH],
+            )
+            recipe.record = record
+            recipes.append(recipe)
+        if not recipes:
+            return
+        Recipe.objects.bulk_create(recipes)
+        if recipes[0].pk is None:
+            ids = dict(Recipe.objects.filter(
+                short_url__in=[recipe.short_url for recipe in recipes]
+            ).values_list('short_url', 'id'))
+            for recipe in recipes:
+                recipe.pk = recipe.id = ids[recipe.short_url]
+        for recipe in recipes:
+            recipe.short_url = encode_short_url(recipe.id)
+            recipe.pub_date = recipe.record['pub_date'] or recipe.pub_date
+        Recipe.objects.bulk_update(recipes, ('short_url', 'pub_date'))
+
+        ingredient_rows = []
+        tag_rows = []
+        for recipe in recipes:
+            for item in recipe.record['ingredients']:
+                key = (item['name'], item['measurement_unit'])
+                ingredient_id = self.ingredients.get(key)
+                if ingredient_id is None:
+                    self.missing_ingredients[key] = (
+                        self.missing_ingredients.get(key, 0) + 1
+                    )
+                    continue
+                ingredient_rows.append(
+                    (recipe.id, ingredient_id, item['amount'])
+                )
+            for slug in recipe.record['tags']:
+                if slug in self.tags:
+                    tag_rows.append((recipe.id, self.tags[slug]))
+        self.__insert(
+            IngredientRecipe, ('recipe_id', 'ingredient_id', 'amount'),
+            ingredient_rows
+        )
+        self.__insert(Recipe.tags.through, ('recipe_id', 'tag_id'), tag_rows)
+        Recipe.objects.filter(
+            id__in=[recipe.id for recipe in recipes]
+        ).update_search_vector()
+        for recipe in Recipe.objects.filter(
+            id__in=[recipe.id for recipe in recipes]
+        ).select_related('author').only(
+            'id', 'author_id', 'pub_date', 'author__followers_count'
+        ):
+            TimelineEntry.objects.fan_out(recipe)
+        self.imported += len(recipes)
+
+    def __parse_date(self, value):
+        pub_date = parse_datetime(value or '')
+        if pub_date is not None and timezone.is_naive(pub_date):
+            return timezone.make_aware(pub_date)
+        return pub_date
+
+    def __get_existing(self, records):
+        """Ключи уже загруженных рецептов: (автор, название) и с датой."""
+        existing = set()
+        for author_id, name, pub_date in Recipe.objects.filter(
+            author_id__in={
+                self.authors[record['author']] for record in records
+                if record['author'] in self.authors
+            },
+            name__in={record['name'] for record in records}
+        ).values_list('author_id', 'name', 'pub_date'):
+            existing.update(((author_id, name), (author_id, name, pub_date)))
+        return existing
+
+    def __insert(self, model, columns, rows):
+        insert_rows(model, columns, rows, self.use_copy)
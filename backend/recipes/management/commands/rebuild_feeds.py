@@ -0,0 +1,19 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import TimelineEntry
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Пересборка лент подписок."""
+
+    help = 'Пересборка лент подписок из подписок и последних рецептов.'
+
+    def handle(self, *args, **options):
+        """Заполнение лент последними рецептами авторов из подписок."""
+        created = TimelineEntry.objects.rebuild()
+        logger.info('Timeline entries rebuilt: %s', created)
+        self.stdout.write(f'Записей в лентах: {created}')
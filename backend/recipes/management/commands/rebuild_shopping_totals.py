@@ -0,0 +1,65 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import IngredientRecipe, ShoppingListTotal
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Пересчёт сумм ингредиентов в списках покупок."""
+
+    help = 'Пересчёт и проверка сумм ингредиентов в списках покупок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сравнить таблицу сумм с пересчётом, не изменяя её.'
+        )
+
+    def handle(self, *args, **options):
+        """Сравнение таблицы сумм с живым пересчётом."""
+        expected = {
+            (row['recipe__shopping_recipe__user'], row['ingredient']):
+                row['total']
+            for row in IngredientRecipe.objects.filter(
+                recipe__shopping_recipe__isnull=False
+            ).values(
+                'recipe__shopping_recipe__user', 'ingredient'
+            ).annotate(total=Sum('amount')).order_by()
+        }
+        actual = dict(
+            ((user_id, ingredient_id), amount)
+            for user_id, ingredient_id, amount
+            in ShoppingListTotal.objects.values_list(
+                'user_id', 'ingredient_id', 'amount'
+            )
+        )
+        mismatches = [
+            key for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        ]
+        self.stdout.write(f'Расхождений: {len(mismatches)}')
+        if not mismatches:
+            return
+        if options['check']:
+            raise CommandError('Таблица сумм не совпадает с пересчётом.')
+        with transaction.atomic():
+            ShoppingListTotal.objects.all().delete()
+            ShoppingListTotal.objects.bulk_create(
+                (
+                    ShoppingListTotal(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        amount=amount
+                    )
+                    for (user_id, ingredient_id), amount in expected.items()
+                ),
+                batch_size=1000
+            )
+        logger.info('Shopping list totals rebuilt.')
+        self.stdout.write(self.style.SUCCESS('Суммы пересчитаны.'))
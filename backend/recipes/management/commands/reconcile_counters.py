@@ -0,0 +1,49 @@
+import logging
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favourite, Recipe
+from users.models import Follow
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favourite, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+class Command(BaseCommand):
+    """Исправление расхождений денормализованных счётчиков."""
+
+    help = 'Пересчёт счётчиков избранного, рецептов и подписчиков.'
+
+    def handle(self, *args, **options):
+        """Обновление только разошедшихся счётчиков."""
+        for model, field, related_model, related_field in COUNTERS:
+            actual = Coalesce(Subquery(
+                related_model.objects.filter(
+                    **{related_field: OuterRef('pk')}
+                ).order_by().values(related_field).annotate(
+                    count=Count('id')
+                ).values('count')
+            ), 0)
+            with transaction.atomic():
+                drifted = model.objects.annotate(
+                    actual=actual
+                ).exclude(**{field: F('actual')}).values('pk')
+                fixed = model.objects.filter(pk__in=drifted).update(
+                    **{field: actual}
+                )
+            logger.info('%s.%s: fixed %s', model.__name__, field, fixed)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}.{field}: '
+                f'исправлено {fixed}'
+            )
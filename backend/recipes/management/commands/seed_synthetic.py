@@ -0,0 +1,308 @@
+import io
+import random
+import time
+import uuid
+from bisect import bisect_left
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from recipes.management.bulk import insert_rows
+from recipes.models import (SHORT_URL_MAX_LENGTH, Favourite, Ingredient,
+                            IngredientRecipe, Recipe, ShoppingList, Tag,
+                            encode_short_url)
+from users.models import Follow
+
+User = get_user_model()
+
+SYNTHETIC_PASSWORD = 'synthetic'
+SYNTHETIC_IMAGE = 'recipes/synthetic.png'
+
+
+class ZipfSampler:
+    """Выбор элементов с вероятностью, обратной рангу в степени s."""
+
+    def __init__(self, items, exponent, rng):
+        self.items = items
+        self.weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(items) + 1)
+        ))
+        self.rng = rng
+
+    def sample(self):
+        point = self.rng.random() * self.weights[-1]
+        return self.items[bisect_left(self.weights, point)]
+
+    def sample_unique(self, count, exclude=None):
+        """Набор различных элементов, не больше половины всех."""
+        available = len(self.items) - (exclude is not None)
+        count = min(count, available // 2 or available)
+        chosen = set()
+        while len(chosen) < count:
+            item = self.sample()
+            if item != exclude:
+                chosen.add(item)
+        return chosen
+
+
+class Command(BaseCommand):
+    """Генерация синтетических данных большого объёма."""
+
+    help = (
+        'Заполнение базы синтетическими пользователями, рецептами, '
+        'избранным, списками покупок и подписками.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, default=10,
+            help='Среднее число ингредиентов в рецепте.'
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Среднее число рецептов в избранном пользователя.'
+        )
+        parser.add_argument(
+            '--shopping', type=int, default=5,
+            help='Среднее число рецептов в списке покупок пользователя.'
+        )
+        parser.add_argument(
+            '--follows', type=int, default=10,
+            help='Среднее число подписок пользователя.'
+        )
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель распределения Ципфа популярности рецептов, '
+                 'авторов и ингредиентов.'
+        )
+        parser.add_argument(
+            '--follow-exponent', type=float, default=1.5,
+            help='Показатель степенного распределения числа подписчиков.'
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='Период публикации рецептов в днях.'
+        )
+        parser.add_argument('--chunk-size', type=int, default=10000)
+        parser.add_argument('--seed', type=int)
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY даже в PostgreSQL.'
+        )
+
+    def handle(self, *args, **options):
+        """Генерация всех таблиц и пересчёт производных данных."""
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError(
+                'Нужно не меньше двух пользователей и одного рецепта.'
+            )
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.chunk_size = options['chunk_size']
+        self.use_copy = (
+            connection.vendor == 'postgresql' and not options['no_copy']
+        )
+        self.ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+        self.tag_ids = list(Tag.objects.values_list('id', flat=True))
+        if not self.ingredient_ids or not self.tag_ids:
+            raise CommandError(
+                'Сначала загрузите ингредиенты и теги (manage.py dataloads).'
+            )
+        self.rng.shuffle(self.ingredient_ids)
+        self.started = time.monotonic()
+        self.inserted = 0
+
+        user_ids = self.__create_users(options['users'])
+        recipe_ids = self.__create_recipes(user_ids, options['recipes'])
+        recipes = ZipfSampler(recipe_ids, options['zipf'], self.rng)
+        self.__create_pairs(
+            Favourite, ('user_id', 'recipe_id'), user_ids,
+            options['favorites'], recipes
+        )
+        self.__create_pairs(
+            ShoppingList, ('user_id', 'recipe_id'), user_ids,
+            options['shopping'], recipes
+        )
+        authors = ZipfSampler(
+            user_ids, options['follow_exponent'], self.rng
+        )
+        self.__create_pairs(
+            Follow, ('user_id', 'author_id'), user_ids,
+            options['follows'], authors, exclude_self=True
+        )
+        self.stdout.write(
+            'Пересчёт счётчиков, лент и списков покупок, '
+            'задачи копий изображений...'
+        )
+        call_command('reconcile_counters', stdout=io.StringIO())
+        call_command('rebuild_feeds', stdout=io.StringIO())
+        call_command('rebuild_shopping_totals', stdout=io.StringIO())
+        call_command('build_image_derivatives', stdout=io.StringIO())
+        self.__report('Готово')
+
+    def __report(self, stage):
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            f'{stage}: {self.inserted} строк, {elapsed:.1f} с '
+            f'({self.inserted / elapsed if elapsed else 0:.0f} строк/с)'
+        )
+
+    def __count(self, mean):
+        """Случайное число около среднего, не меньше единицы."""
+        return max(1, round(self.rng.expovariate(1 / mean)))
+
+    def __create_users(self, count):
+        prefix = f'synthetic-{uuid.uuid4().hex[:8]}'
+        password = make_password(SYNTHETIC_PASSWORD)
+        for start in range(0, count, self.chunk_size):
+            User.objects.bulk_create(
+                User(
+                    username=f'{prefix}-{number}',
+                    email=f'{prefix}-{number}@example.com',
+                    first_name='Synthetic',
+                    last_name=str(number),
+                    password=password,
+                )
+                for number in range(
+                    start, min(start + self.chunk_size, count)
+                )
+            )
+            self.inserted += min(self.chunk_size, count - start)
+        self.__report('Пользователи')
+        return list(User.objects.filter(
+            username__startswith=f'{prefix}-'
+        ).order_by('id').values_list('id', flat=True))
+
+    def __create_recipes(self, user_ids, count):
+        authors = ZipfSampler(user_ids, self.options['zipf'], self.rng)
+        ingredients = ZipfSampler(
+            self.ingredient_ids, self.options['zipf'], self.rng
+        )
+        now = timezone.now()
+        period = self.options['days'] * 24 * 60 * 60
+        recipe_ids = []
+        for start in range(0, count, self.chunk_size):
+            size = min(self.chunk_size, count - start)
+            with transaction.atomic():
+                ids = self.__insert_recipes([
+                    (
+                        authors.sample(),
+                        f'Синтетический рецепт {start + number}',
+                        now - timedelta(seconds=self.rng.randrange(period)),
+                        self.rng.randint(1, 180),
+                    )
+                    for number in range(size)
+                ])
+                ingredient_rows = []
+                tag_rows = []
+                for recipe_id in ids:
+                    ingredient_rows.extend(
+                        (recipe_id, ingredient_id, self.rng.randint(1, 500))
+                        for ingredient_id in ingredients.sample_unique(
+                            self.__count(
+                                self.options['ingredients_per_recipe']
+                            )
+                        )
+                    )
+                    tag_rows.extend(
+                        (recipe_id, tag_id)
+                        for tag_id in self.rng.sample(
+                            self.tag_ids,
+                            self.rng.randint(1, min(3, len(self.tag_ids)))
+                        )
+                    )
+                self.__insert(
+                    IngredientRecipe,
+                    ('recipe_id', 'ingredient_id', 'amount'),
+                    ingredient_rows
+                )
+                self.__insert(
+                    Recipe.tags.through, ('recipe_id', 'tag_id'), tag_rows
+                )
+                Recipe.objects.filter(id__in=ids).update_search_vector()
+            recipe_ids.extend(ids)
+            self.inserted += size + len(ingredient_rows) + len(tag_rows)
+            self.__report('Рецепты')
+        return recipe_ids
+
+    def __insert_recipes(self, rows):
+        """Вставка рецептов с каноническими короткими кодами."""
+        if self.use_copy:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+                    'FROM generate_series(1, %s)',
+                    (Recipe._meta.db_table, len(rows))
+                )
+                ids = [row[0] for row in cursor.fetchall()]
+            self.__insert(
+                Recipe,
+                ('id', 'author_id', 'name', 'pub_date', 'updated_at',
+                 'cooking_time', 'text', 'image', 'image_derivatives',
+                 'short_url', 'favorites_count'),
+                [
+                    (id, author_id, name, pub_date.isoformat(),
+                     pub_date.isoformat(), cooking_time, name,
+                     SYNTHETIC_IMAGE, '{}', encode_short_url(id), 0)
+                    for id, (author_id, name, pub_date, cooking_time)
+                    in zip(ids, rows)
+                ]
+            )
+            return ids
+        recipes = [
+            Recipe(
+                author_id=author_id,
+                name=name,
+                text=name,
+                cooking_time=cooking_time,
+                image=SYNTHETIC_IMAGE,
+                short_url=uuid.uuid4().hex[:SHORT_URL_MAX_LENGTH],
+            )
+            for author_id, name, _, cooking_time in rows
+        ]
+        Recipe.objects.bulk_create(recipes)
+        if recipes[0].pk is None:
+            ids = dict(Recipe.objects.filter(
+                short_url__in=[recipe.short_url for recipe in recipes]
+            ).values_list('short_url', 'id'))
+            for recipe in recipes:
+                recipe.pk = recipe.id = ids[recipe.short_url]
+        for recipe, (_, _, pub_date, _) in zip(recipes, rows):
+            recipe.short_url = encode_short_url(recipe.id)
+            recipe.pub_date = pub_date
+        Recipe.objects.bulk_update(recipes, ('short_url', 'pub_date'))
+        return [recipe.id for recipe in recipes]
+
+    def __create_pairs(self, model, columns, user_ids, mean, sampler,
+                       exclude_self=False):
+        """Связи пользователей с популярными по Ципфу объектами."""
+        rows = []
+        for user_id in user_ids:
+            rows.extend(
+                (user_id, target)
+                for target in sampler.sample_unique(
+                    self.__count(mean),
+                    exclude=user_id if exclude_self else None
+                )
+            )
+            if len(rows) >= self.chunk_size:
+                self.__insert(model, columns, rows)
+                self.inserted += len(rows)
+                rows = []
+        self.__insert(model, columns, rows)
+        self.inserted += len(rows)
+        self.__report(model._meta.verbose_name_plural)
+
+    def __insert(self, model, columns, rows):
+        insert_rows(model, columns, rows, self.use_copy, self.chunk_size)
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.3 on 2026-10-17 15:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+from sqids import Sqids
+
+
+def backfill_short_links(apps, schema_editor):
+    """Старые коды переносятся в ShortLink, рецепты получают коды из id."""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    ShortLink = apps.get_model('recipes', 'ShortLink')
+    sqids = Sqids()
+    recipes = list(Recipe.objects.only('id', 'short_url'))
+    ShortLink.objects.bulk_create(
+        (
+            ShortLink(code=recipe.short_url, recipe_id=recipe.id)
+            for recipe in recipes if recipe.short_url
+        ),
+        batch_size=1000
+    )
+    for recipe in recipes:
+        recipe.short_url = sqids.encode([recipe.id])
+    Recipe.objects.bulk_update(recipes, ('short_url',), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='short_url',
+            field=models.CharField(blank=True, db_index=True, max_length=20, null=True, unique=True),
+        ),
+        migrations.CreateModel(
+            name='ShortLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=20, unique=True)),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='short_links', to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Короткая ссылка',
+                'verbose_name_plural': 'Короткие ссылки',
+            },
+        ),
+        migrations.RunPython(backfill_short_links, migrations.RunPython.noop),
+    ]
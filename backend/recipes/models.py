@@ -1,10 +1,14 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.validators import MinValueValidator
-from django.db import models
-from django.db.models import UniqueConstraint
-from django.utils import timezone
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Case, F, UniqueConstraint, Value, When
 from sqids import Sqids
 
+from users.models import Follow
+
 NAME_MAX_LENGTH = 150
 EMAIL_MAX_LENGTH = 254
 NAME_MAX_LENGTH_RECIPES = 256
@@ -14,9 +18,25 @@ MIN_VALUE = 1
 TAG_SLUG_MAX_LENGTH = 32
 TAG_NAME_MAX_LENGTH = 32
 INGREDIENT_NAME_MAX_LENGTH = 128
+SEARCH_CONFIG = 'russian'
 
 User = get_user_model()
 
+sqids = Sqids()
+
+
+def encode_short_url(recipe_id):
+    """Короткий код, из которого декодируется id рецепта."""
+    return sqids.encode([recipe_id])
+
+
+def decode_short_url(code):
+    """Id рецепта из короткого кода или None для кода другого формата."""
+    numbers = sqids.decode(code)
+    if len(numbers) == 1 and sqids.encode(numbers) == code:
+        return numbers[0]
+    return None
+
 
 class Tag(models.Model):
     """Модель тега."""
@@ -66,6 +86,29 @@ class Ingredient(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Запросы рецептов с поддержкой полнотекстового поиска."""
+
+    def update_search_vector(self):
+        """Пересчёт поискового вектора по названию и описанию."""
+        if connection.vendor != 'postgresql':
+            return 0
+        return self.update(search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+        ))
+
+    def with_related(self):
+        """Автор, теги и ингредиенты для сериализации рецептов."""
+        return self.select_related('author').prefetch_related(
+            models.Prefetch(
+                'ingredient_list',
+                queryset=IngredientRecipe.objects.select_related('ingredient')
+            ),
+            'tags'
+        )
+
+
 class Recipe(models.Model):
     """Модель рецепта."""
 
@@ -92,6 +135,9 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         'Дата публикации рецепта', auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения рецепта', auto_now=True, db_index=True
+    )
     text = models.TextField(
         'Описание рецепта', help_text='Заполните описание рецепта'
     )
@@ -102,35 +148,68 @@ class Recipe(models.Model):
     image = models.ImageField(
         'Изображение для рецепта', upload_to='recipes/'
     )
+    image_derivatives = models.JSONField(
+        'Уменьшенные копии изображения', default=dict, editable=False
+    )
 
     short_url = models.CharField(
         max_length=SHORT_URL_MAX_LENGTH,
         unique=True,
         db_index=True,
-        blank=True
+        blank=True,
+        null=True
+    )
+    favorites_count = models.PositiveIntegerField(
+        'Количество добавлений в избранное', default=0, editable=False
     )
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(
+                fields=('pub_date', 'id'), name='recipe_pub_date_id_idx'
+            ),
+            GinIndex(
+                fields=('search_vector',), name='recipe_search_vector_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name
 
     def save(self, *args, **kwargs):
-        """Создание короткой ссылки."""
+        """Создание короткой ссылки из id рецепта."""
+        super(Recipe, self).save(*args, **kwargs)
         if not self.short_url:
-            now = timezone.now()
-            keys_for_short_url = [
-                round(now.timestamp() * 1000),
-                self.author.id,
-                self.cooking_time
-            ]
-            sqids = Sqids()
-            code = sqids.encode(keys_for_short_url)
-            self.short_url = code
-        return super(Recipe, self).save(*args, **kwargs)
+            self.short_url = encode_short_url(self.pk)
+            Recipe.objects.filter(pk=self.pk).update(short_url=self.short_url)
+        Recipe.objects.filter(pk=self.pk).update_search_vector()
+
+
+class ShortLink(models.Model):
+    """Короткая ссылка старого формата, не содержащая id рецепта."""
+
+    code = models.CharField(
+        max_length=SHORT_URL_MAX_LENGTH, unique=True
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='short_links',
+        verbose_name='Рецепт'
+    )
+
+    class Meta:
+        verbose_name = 'Короткая ссылка'
+        verbose_name_plural = 'Короткие ссылки'
+
+    def __str__(self):
+        return self.code
 
 
 class IngredientRecipe(models.Model):
@@ -161,12 +240,71 @@ class IngredientRecipe(models.Model):
         return self.ingredient
 
 
+class FavouriteAndShoppingListManager(models.Manager):
+    """Пакетное добавление и удаление рецептов пользователя."""
+
+    def add_many(self, user_id, recipe_ids):
+        """Вставка связей; id рецептов, добавленных именно этим вызовом.
+
+        Вставленные строки возвращает INSERT ... ON CONFLICT DO NOTHING
+        RETURNING; в базах без него строки вставляются по одной.
+        """
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return set()
+        if not self.__can_return_inserted():
+            return self.__add_one_by_one(user_id, recipe_ids)
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, recipe_id) '
+                f'VALUES {", ".join(["(%s, %s)"] * len(recipe_ids))} '
+                'ON CONFLICT (user_id, recipe_id) DO NOTHING '
+                'RETURNING recipe_id',
+                [value for id in recipe_ids for value in (user_id, id)]
+            )
+            return {row[0] for row in cursor.fetchall()}
+
+    def __can_return_inserted(self):
+        if connection.vendor == 'postgresql':
+            return True
+        return (
+            connection.vendor == 'sqlite'
+            and connection.Database.sqlite_version_info >= (3, 35)
+        )
+
+    def __add_one_by_one(self, user_id, recipe_ids):
+        """Вставка по строке в точках сохранения, конфликт — не добавлен."""
+        added = set()
+        for id in recipe_ids:
+            try:
+                with transaction.atomic():
+                    self.bulk_create(
+                        [self.model(user_id=user_id, recipe_id=id)]
+                    )
+            except IntegrityError:
+                continue
+            added.add(id)
+        return added
+
+    def remove_many(self, user_id, recipe_ids):
+        """Удаление связей; id рецептов, удалённых именно этим вызовом."""
+        with transaction.atomic():
+            removed = set(self.select_for_update().filter(
+                user_id=user_id, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True))
+            self.filter(user_id=user_id, recipe_id__in=removed).delete()
+        return removed
+
+
 class FavouriteAndShoppingList(models.Model):
     """Общая структура для моделей 'Избранное' и 'Список покупок'."""
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
 
+    objects = FavouriteAndShoppingListManager()
+
     class Meta:
         abstract = True
 
@@ -206,3 +344,273 @@ class ShoppingList(FavouriteAndShoppingList):
     def __str__(self):
         return (f'Рецепт {self.recipe} добавлен в список '
                 f'покупок {self.user.username}')
+
+
+class ShoppingListTotalManager(models.Manager):
+    """Инкрементальное обновление сумм ингредиентов в списках покупок."""
+
+    def apply_changes(self, user_ids, changes):
+        """Прибавление изменений {ingredient_id: delta} пользователям.
+
+        В PostgreSQL суммы обновляются одним INSERT ... ON CONFLICT,
+        поэтому параллельные изменения одной строки не теряются.
+        """
+        changes = {
+            ingredient_id: delta
+            for ingredient_id, delta in changes.items() if delta
+        }
+        user_ids = sorted(set(user_ids))
+        if not user_ids or not changes:
+            return
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                self.__upsert(user_ids, changes)
+            else:
+                self.__update_or_insert(user_ids, changes)
+            self.filter(user_id__in=user_ids, amount__lte=0).delete()
+
+    def __upsert(self, user_ids, changes):
+        """Атомарное прибавление изменений через ON CONFLICT DO UPDATE."""
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        rows = [
+            (user_id, ingredient_id, delta)
+            for user_id in user_ids
+            for ingredient_id, delta in sorted(changes.items())
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, ingredient_id, amount) '
+                f'VALUES {", ".join(["(%s, %s, %s)"] * len(rows))} '
+                'ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+                f'SET amount = {table}.amount + EXCLUDED.amount',
+                [value for row in rows for value in row]
+            )
+
+    def __update_or_insert(self, user_ids, changes):
+        """Обновление существующих сумм и вставка новых с повтором.
+
+        Строку, которую параллельный запрос вставил после чтения
+        существующих, обновляем повторно после конфликта вставки.
+        """
+        totals = self.filter(user_id__in=user_ids, ingredient_id__in=changes)
+        existing = set(totals.values_list('user_id', 'ingredient_id'))
+        totals.update(amount=F('amount') + Case(
+            *(When(ingredient_id=ingredient_id, then=Value(delta))
+              for ingredient_id, delta in changes.items()),
+            output_field=models.IntegerField()
+        ))
+        for user_id in user_ids:
+            for ingredient_id, delta in changes.items():
+                if delta <= 0 or (user_id, ingredient_id) in existing:
+                    continue
+                try:
+                    with transaction.atomic():
+                        self.create(
+                            user_id=user_id,
+                            ingredient_id=ingredient_id,
+                            amount=delta
+                        )
+                except IntegrityError:
+                    self.filter(
+                        user_id=user_id, ingredient_id=ingredient_id
+                    ).update(amount=F('amount') + delta)
+
+    def add_recipe(self, user_id, recipe_id, sign=1):
+        """Добавление (sign=1) или удаление (sign=-1) рецепта из сумм."""
+        self.add_recipes(user_id, (recipe_id,), sign)
+
+    def add_recipes(self, user_id, recipe_ids, sign=1):
+        """Добавление или удаление нескольких рецептов одним запросом."""
+        self.apply_changes((user_id,), self.get_changes(recipe_ids, sign))
+
+    def get_changes(self, recipe_ids, sign=1):
+        """Изменения {ingredient_id: delta} от рецептов со знаком sign."""
+        changes = {}
+        for ingredient_id, amount in IngredientRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('ingredient_id', 'amount'):
+            changes[ingredient_id] = (
+                changes.get(ingredient_id, 0) + sign * amount
+            )
+        return changes
+
+
+class ShoppingListTotal(models.Model):
+    """Сумма ингредиента по всем рецептам списка покупок пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_totals',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_totals',
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField('Количество')
+
+    objects = ShoppingListTotalManager()
+
+    class Meta:
+        verbose_name = 'Сумма в списке покупок'
+        verbose_name_plural = 'Суммы в списках покупок'
+        constraints = (
+            UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_user_and_ingredient_in_ShoppingListTotal',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.ingredient} - {self.amount} у {self.user.username}'
+
+
+class TimelineEntryManager(models.Manager):
+    """Раздача рецептов в ленты подписчиков при записи."""
+
+    def is_popular(self, author):
+        """Рецепты популярных авторов читаются из Recipe при запросе ленты."""
+        return author.followers_count >= settings.FEED_FANOUT_MAX_FOLLOWERS
+
+    def fan_out(self, recipe):
+        """Добавление нового рецепта в ленты подписчиков автора."""
+        if self.is_popular(recipe.author):
+            return
+        self.bulk_create(
+            (
+                self.model(
+                    user_id=user_id,
+                    recipe_id=recipe.id,
+                    author_id=recipe.author_id,
+                    pub_date=recipe.pub_date
+                )
+                for user_id in Follow.objects.filter(
+                    author_id=recipe.author_id
+                ).values_list('user_id', flat=True).iterator()
+            ),
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+
+    def backfill(self, user_id, author):
+        """Последние рецепты автора в ленту нового подписчика."""
+        self.__backfill((user_id,), author)
+
+    def backfill_followers(self, author):
+        """Последние рецепты автора в ленты всех подписчиков.
+
+        Нужна, когда автор перестаёт быть популярным: рецепты, которые
+        он публиковал популярным, не раздавались в ленты.
+        """
+        self.__backfill(
+            Follow.objects.filter(author_id=author.id).values_list(
+                'user_id', flat=True
+            ).iterator(),
+            author
+        )
+
+    def __backfill(self, user_ids, author):
+        if self.is_popular(author):
+            return
+        recipes = list(Recipe.objects.filter(
+            author=author
+        ).order_by('-pub_date', '-id').values_list(
+            'id', 'pub_date'
+        )[:settings.FEED_BACKFILL_SIZE])
+        self.bulk_create(
+            (
+                self.model(
+                    user_id=user_id,
+                    recipe_id=recipe_id,
+                    author_id=author.id,
+                    pub_date=pub_date
+                )
+                for user_id in user_ids
+                for recipe_id, pub_date in recipes
+            ),
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+
+    def trim(self, user_id, author_id):
+        """Удаление рецептов автора из ленты после отписки."""
+        self.filter(user_id=user_id, author_id=author_id).delete()
+
+    def rebuild(self):
+        """Пересборка всех лент одним запросом INSERT ... SELECT."""
+        quote = connection.ops.quote_name
+        with transaction.atomic():
+            self.all().delete()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {quote(self.model._meta.db_table)} '
+                    '(user_id, recipe_id, author_id, pub_date) '
+                    'SELECT follow.user_id, ranked.id, ranked.author_id, '
+                    'ranked.pub_date '
+                    f'FROM {quote(Follow._meta.db_table)} AS follow '
+                    f'JOIN {quote(User._meta.db_table)} AS author '
+                    'ON author.id = follow.author_id '
+                    'AND author.followers_count < %s '
+                    'JOIN (SELECT id, author_id, pub_date, '
+                    'ROW_NUMBER() OVER ('
+                    'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+                    f') AS row_number FROM {quote(Recipe._meta.db_table)}'
+                    ') AS ranked ON ranked.author_id = follow.author_id '
+                    'AND ranked.row_number <= %s',
+                    (
+                        settings.FEED_FANOUT_MAX_FOLLOWERS,
+                        settings.FEED_BACKFILL_SIZE
+                    )
+                )
+                return cursor.rowcount
+
+
+class TimelineEntry(models.Model):
+    """Рецепт в ленте подписок пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта'
+    )
+    pub_date = models.DateTimeField('Дата публикации рецепта')
+
+    objects = TimelineEntryManager()
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        constraints = (
+            UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_user_and_recipe_in_TimelineEntry',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', 'author'), name='timeline_user_author_idx'
+            ),
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='timeline_user_pub_date_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user.username}'
@@ -0,0 +1,56 @@
+import threading
+from bisect import bisect_left
+
+from recipes.models import Ingredient
+from recipes.versions import INGREDIENTS_VERSION, get_version
+
+
+class IngredientPrefixIndex:
+    """Индекс ингредиентов в памяти процесса для поиска по началу названия."""
+
+    def __init__(self):
+        self._entries = ([], [])
+        self._version = None
+        self._lock = threading.Lock()
+
+    def rebuild(self, version=None):
+        """Загрузка ингредиентов в отсортированный массив."""
+        rows = sorted(
+            (
+                (name.lower(), {
+                    'id': id,
+                    'name': name,
+                    'measurement_unit': measurement_unit,
+                })
+                for id, name, measurement_unit
+                in Ingredient.objects.values_list(
+                    'id', 'name', 'measurement_unit'
+                ).iterator()
+            ),
+            key=lambda row: (row[0], row[1]['id'])
+        )
+        self._entries = (
+            [key for key, _ in rows], [row for _, row in rows]
+        )
+        self._version = version
+
+    def search(self, prefix='', limit=None):
+        """Ингредиенты, название которых начинается с prefix."""
+        version = get_version(INGREDIENTS_VERSION)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self.rebuild(version)
+        keys, rows = self._entries
+        prefix = prefix.lower()
+        start = bisect_left(keys, prefix)
+        end = len(keys) if limit is None else start + limit
+        result = []
+        for index in range(start, min(end, len(keys))):
+            if not keys[index].startswith(prefix):
+                break
+            result.append(rows[index])
+        return result
+
+
+ingredient_index = IngredientPrefixIndex()
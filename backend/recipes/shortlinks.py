@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from recipes.models import (Recipe, ShortLink, decode_short_url,
+                            encode_short_url)
+
+
+class ShortLinkResolver:
+    """Id существующего рецепта по короткому коду.
+
+    Коды нового формата декодируются без обращения к базе, коды старого
+    формата ищутся в ShortLink; в обоих случаях проверяется, что рецепт
+    существует. Найденные и отсутствующие коды хранятся в ограниченных
+    LRU-кэшах процесса, сигналы создания и удаления рецептов сбрасывают
+    их записи.
+    """
+
+    def __init__(self, size, missing_size):
+        self.size = size
+        self.missing_size = missing_size
+        self._known = OrderedDict()
+        self._missing = OrderedDict()
+        self._codes = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, code):
+        with self._lock:
+            if code in self._known:
+                self._known.move_to_end(code)
+                return self._known[code]
+            if code in self._missing:
+                self._missing.move_to_end(code)
+                return None
+        recipe_id = decode_short_url(code)
+        if recipe_id is None:
+            recipe_id = ShortLink.objects.filter(
+                code=code
+            ).values_list('recipe_id', flat=True).first()
+        if (recipe_id is not None
+                and not Recipe.objects.filter(pk=recipe_id).exists()):
+            recipe_id = None
+        with self._lock:
+            if recipe_id is None:
+                self.__store_missing(code)
+            else:
+                self.__store_known(code, recipe_id)
+        return recipe_id
+
+    def forget(self, recipe_id):
+        """Сброс кэшированных кодов рецепта после создания или удаления."""
+        with self._lock:
+            for code in self._codes.pop(recipe_id, ()):
+                self._known.pop(code, None)
+            self._missing.pop(encode_short_url(recipe_id), None)
+
+    def __store_known(self, code, recipe_id):
+        self._known[code] = recipe_id
+        self._known.move_to_end(code)
+        self._codes.setdefault(recipe_id, set()).add(code)
+        while len(self._known) > self.size:
+            code, recipe_id = self._known.popitem(last=False)
+            codes = self._codes[recipe_id]
+            codes.discard(code)
+            if not codes:
+                del self._codes[recipe_id]
+
+    def __store_missing(self, code):
+        self._missing[code] = None
+        self._missing.move_to_end(code)
+        while len(self._missing) > self.missing_size:
+            self._missing.popitem(last=False)
+
+
+short_links = ShortLinkResolver(
+    settings.SHORT_LINK_CACHE_SIZE, settings.SHORT_LINK_MISSING_CACHE_SIZE
+)
@@ -0,0 +1,140 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from api.tasks import backfill_timelines
+from recipes.models import (Favourite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingListTotal, Tag)
+from recipes.shortlinks import short_links
+from recipes.similar import similar_recipes
+from recipes.versions import (INGREDIENTS_VERSION, RECIPE_VERSION,
+                              TAGS_VERSION, USER_VERSION, bump_version)
+from users.models import Follow
+
+User = get_user_model()
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарное изменение счётчика через F()."""
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def bump_version_on_commit(name):
+    """Смена версии после фиксации транзакции."""
+    transaction.on_commit(lambda: bump_version(name))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(**kwargs):
+    """Смена версии ингредиентов после изменения."""
+    bump_version(INGREDIENTS_VERSION)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(**kwargs):
+    """Смена версии тегов после изменения."""
+    bump_version(TAGS_VERSION)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_changed(instance, **kwargs):
+    """Смена версии рецепта после изменения."""
+    bump_version_on_commit(RECIPE_VERSION.format(instance.id))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_added_or_removed(instance, created=True, **kwargs):
+    """Сброс кэша коротких ссылок после создания или удаления рецепта."""
+    if created:
+        recipe_id = instance.id
+        transaction.on_commit(lambda: short_links.forget(recipe_id))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_removed_from_similar(instance, **kwargs):
+    """Удаление рецепта из индекса похожих рецептов процесса."""
+    recipe_id = instance.id
+    transaction.on_commit(lambda: similar_recipes.discard((recipe_id,)))
+
+
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+def recipe_ingredient_changed(instance, **kwargs):
+    """Смена версии рецепта после изменения его ингредиентов."""
+    bump_version_on_commit(RECIPE_VERSION.format(instance.recipe_id))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(instance, action, **kwargs):
+    """Смена версии рецепта после изменения его тегов."""
+    if action.startswith('post_') and isinstance(instance, Recipe):
+        bump_version_on_commit(RECIPE_VERSION.format(instance.id))
+
+
+@receiver((post_save, post_delete), sender=User)
+def user_changed(instance, **kwargs):
+    """Смена версии пользователя после изменения."""
+    bump_version_on_commit(USER_VERSION.format(instance.id))
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    """Вычитание удаляемого рецепта из сумм списков покупок."""
+    ShoppingListTotal.objects.apply_changes(
+        instance.shopping_recipe.values_list('user_id', flat=True),
+        ShoppingListTotal.objects.get_changes((instance.id,), sign=-1)
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(instance, created, **kwargs):
+    """Увеличение счётчика рецептов автора."""
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_removed(instance, **kwargs):
+    """Уменьшение счётчика рецептов автора."""
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Favourite)
+def favourite_created(instance, created, **kwargs):
+    """Увеличение счётчика избранного рецепта."""
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favourite)
+def favourite_removed(instance, **kwargs):
+    """Уменьшение счётчика избранного рецепта."""
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(instance, created, **kwargs):
+    """Увеличение счётчика подписчиков автора."""
+    if created:
+        change_counter(User, instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_removed(instance, **kwargs):
+    """Уменьшение счётчика подписчиков автора.
+
+    Если автор перестаёт быть популярным, его рецепты, опубликованные
+    без раздачи в ленты, дозаполняются в ленты подписчиков задачей.
+    """
+    followers_count = User.objects.select_for_update().filter(
+        pk=instance.author_id
+    ).values_list('followers_count', flat=True).first()
+    change_counter(User, instance.author_id, 'followers_count', -1)
+    if followers_count == settings.FEED_FANOUT_MAX_FOLLOWERS:
+        backfill_timelines.delay(author_id=instance.author_id)
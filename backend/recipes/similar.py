@@ -0,0 +1,166 @@
+import heapq
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from recipes.models import IngredientRecipe, Recipe
+
+logger = logging.getLogger(__name__)
+
+SYNC_OVERLAP = timedelta(minutes=5)
+
+
+class SimilarRecipeIndex:
+    """Индекс рецептов по ингредиентам в памяти процесса.
+
+    Рецепт — разреженный вектор ингредиентов с весами IDF, похожесть —
+    косинус между векторами. Кандидаты берутся из списков рецептов
+    по каждому ингредиенту; слишком частые ингредиенты (соль, вода)
+    почти не влияют на вес и пропускаются. После первой загрузки
+    фоновый поток раз в refresh_interval секунд дочитывает рецепты,
+    изменённые с прошлой синхронизации, и убирает удалённые; запросы
+    только ищут по уже построенному индексу.
+    """
+
+    def __init__(self, refresh_interval, max_document_frequency):
+        self.refresh_interval = refresh_interval
+        self.max_document_frequency = max_document_frequency
+        self._recipes = {}
+        self._norms = {}
+        self._postings = {}
+        self._synced_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def warm(self):
+        """Загрузка индекса и его обновление в фоновом потоке процесса."""
+        threading.Thread(
+            target=self.__refresh_forever, name='similar-recipes-refresh',
+            daemon=True
+        ).start()
+
+    def __refresh_forever(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception('Similar recipes index refresh failed')
+            finally:
+                connection.close()
+            time.sleep(self.refresh_interval)
+
+    def refresh(self):
+        """Загрузка рецептов, изменённых после прошлой синхронизации."""
+        with self._refresh_lock:
+            self.__load()
+
+    def discard(self, recipe_ids):
+        """Удаление рецептов из индекса."""
+        with self._lock:
+            for recipe_id in recipe_ids:
+                self.__remove(recipe_id)
+
+    def search(self, recipe_id, ingredient_ids, limit):
+        """Id рецептов, наиболее похожих по ингредиентам, с оценками."""
+        if self._synced_at is None:
+            # Первый поиск ждёт загрузки; без фонового потока
+            # (команды, тесты) индекс загружается здесь.
+            with self._refresh_lock:
+                if self._synced_at is None:
+                    self.__load()
+        with self._lock:
+            weights = {
+                ingredient_id: self.__idf(ingredient_id)
+                for ingredient_id in set(ingredient_ids)
+            }
+            norm = math.sqrt(sum(weight ** 2 for weight in weights.values()))
+            if not norm:
+                return []
+            max_postings = max(
+                1, len(self._recipes) * self.max_document_frequency
+            )
+            scores = {}
+            for ingredient_id, weight in weights.items():
+                posting = self._postings.get(ingredient_id, ())
+                if len(posting) > max_postings:
+                    continue
+                for candidate in posting:
+                    scores[candidate] = (
+                        scores.get(candidate, 0) + weight ** 2
+                    )
+            scores.pop(recipe_id, None)
+            return [
+                (candidate, score / (norm * self._norms[candidate]))
+                for candidate, score in heapq.nlargest(
+                    limit,
+                    scores.items(),
+                    key=lambda item: item[1] / self._norms[item[0]]
+                )
+            ]
+
+    def __load(self):
+        """Чтение изменений из базы; поиск блокируется только на замену."""
+        started = timezone.now()
+        rows = IngredientRecipe.objects.order_by('recipe_id')
+        if self._synced_at is not None:
+            rows = rows.filter(
+                recipe__updated_at__gte=self._synced_at - SYNC_OVERLAP
+            )
+        loaded = [
+            (recipe_id, tuple(
+                ingredient_id for _, ingredient_id in group
+            ))
+            for recipe_id, group in groupby(
+                rows.values_list('recipe_id', 'ingredient_id').iterator(),
+                key=itemgetter(0)
+            )
+        ]
+        existing = set(Recipe.objects.values_list('id', flat=True))
+        loaded = [item for item in loaded if item[0] in existing]
+        with self._lock:
+            for recipe_id in self._recipes.keys() - existing:
+                self.__remove(recipe_id)
+            for recipe_id, ingredient_ids in loaded:
+                self.__store(recipe_id, ingredient_ids)
+            # Нормы считаются по IDF на момент загрузки рецептов:
+            # частоты ингредиентов меняются медленно, а пересчёт
+            # всех норм дорог.
+            for recipe_id, _ in loaded:
+                self._norms[recipe_id] = math.sqrt(sum(
+                    self.__idf(ingredient_id) ** 2
+                    for ingredient_id in self._recipes[recipe_id]
+                )) or 1
+            self._synced_at = started
+
+    def __idf(self, ingredient_id):
+        frequency = len(self._postings.get(ingredient_id, ()))
+        return math.log((1 + len(self._recipes)) / (1 + frequency)) + 1
+
+    def __store(self, recipe_id, ingredient_ids):
+        self.__remove(recipe_id)
+        self._recipes[recipe_id] = ingredient_ids
+        for ingredient_id in ingredient_ids:
+            self._postings.setdefault(ingredient_id, set()).add(recipe_id)
+
+    def __remove(self, recipe_id):
+        for ingredient_id in self._recipes.pop(recipe_id, ()):
+            posting = self._postings.get(ingredient_id)
+            if posting is not None:
+                posting.discard(recipe_id)
+                if not posting:
+                    del self._postings[ingredient_id]
+        self._norms.pop(recipe_id, None)
+
+
+similar_recipes = SimilarRecipeIndex(
+    settings.SIMILAR_RECIPES_REFRESH_INTERVAL,
+    settings.SIMILAR_RECIPES_MAX_DOCUMENT_FREQUENCY,
+)
@@ -0,0 +1,111 @@
+import io
+import json
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from recipes.models import (Ingredient, IngredientRecipe, Recipe, Tag,
+                            TimelineEntry)
+from users.models import Follow
+
+User = get_user_model()
+
+
+class ImportRecipesTests(TestCase):
+    """Загрузка рецептов из JSONL."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                first_name=name, last_name=name, password='password'
+            )
+            for name in ('author', 'reader')
+        )
+        Tag.objects.create(name='Завтрак', slug='breakfast')
+        Ingredient.objects.create(name='мука', measurement_unit='г')
+
+    def setUp(self):
+        self.file = tempfile.NamedTemporaryFile(
+            'w', suffix='.jsonl', encoding='utf-8'
+        )
+        self.addCleanup(self.file.close)
+
+    def write(self, *records):
+        for record in records:
+            self.file.write(json.dumps({
+                'author': 'author@example.com',
+                'text': 'Текст',
+                'cooking_time': 10,
+                'image': 'recipes/imported.png',
+                'tags': ['breakfast'],
+                'ingredients': [
+                    {'name': 'мука', 'measurement_unit': 'г', 'amount': 100}
+                ],
+                **record,
+            }, ensure_ascii=False) + '\n')
+        self.file.flush()
+
+    def load(self):
+        stdout = io.StringIO()
+        call_command(
+            'import_recipes', self.file.name, '--chunk-size', '2',
+            stdout=stdout
+        )
+        return stdout.getvalue()
+
+    def test_repeated_import_does_not_duplicate(self):
+        self.write(
+            {'name': 'Блины', 'pub_date': '2024-01-01T10:00:00'},
+            {'name': 'Блины', 'pub_date': '2024-02-01T10:00:00+03:00'},
+            {'name': 'Оладьи'},
+        )
+        self.load()
+        self.load()
+        self.assertEqual(Recipe.objects.count(), 3)
+        self.assertEqual(IngredientRecipe.objects.count(), 3)
+        self.assertEqual(Recipe.tags.through.objects.count(), 3)
+
+    def test_duplicates_inside_file_are_skipped(self):
+        self.write(*[{'name': 'Блины'}] * 3)
+        self.load()
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_missing_ingredients_are_reported(self):
+        self.write(
+            {'name': 'Блины', 'ingredients': [
+                {'name': 'мука', 'measurement_unit': 'г', 'amount': 100},
+                {'name': 'молоко', 'measurement_unit': 'мл', 'amount': 200},
+            ]},
+            {'name': 'Оладьи', 'ingredients': [
+                {'name': 'молоко', 'measurement_unit': 'мл', 'amount': 100},
+            ]},
+        )
+        output = self.load()
+        self.assertEqual(IngredientRecipe.objects.count(), 1)
+        self.assertIn('ингредиентов не из справочника: 2', output)
+        self.assertIn('молоко (мл) — 2', output)
+
+    def test_only_imported_recipes_are_fanned_out(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        stale = TimelineEntry.objects.create(
+            user=self.author, author=self.reader,
+            recipe=Recipe.objects.create(
+                author=self.reader, name='Старый', text='Текст',
+                cooking_time=1, image='recipes/test.png'
+            ),
+            pub_date='2024-01-01T10:00:00Z'
+        )
+        self.write({'name': 'Блины'}, {'name': 'Оладьи'})
+        self.load()
+        self.assertCountEqual(
+            TimelineEntry.objects.filter(user=self.reader).values_list(
+                'recipe__name', flat=True
+            ),
+            ['Блины', 'Оладьи']
+        )
+        # Ленты, не связанные с загрузкой, не пересобираются.
+        self.assertTrue(TimelineEntry.objects.filter(pk=stale.pk).exists())
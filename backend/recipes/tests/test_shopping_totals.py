@@ -0,0 +1,55 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.test import TestCase
+
+from recipes.models import Ingredient, ShoppingListTotal
+
+User = get_user_model()
+
+
+class ShoppingListTotalTests(TestCase):
+    """Инкрементальные суммы списка покупок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer', email='buyer@example.com',
+            first_name='Buyer', last_name='Buyer', password='password'
+        )
+        cls.flour, cls.sugar = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('мука', 'сахар')
+        )
+
+    def totals(self):
+        return dict(ShoppingListTotal.objects.filter(
+            user=self.user
+        ).values_list('ingredient_id', 'amount'))
+
+    def test_changes_are_added_and_empty_rows_removed(self):
+        ShoppingListTotal.objects.apply_changes(
+            [self.user.id], {self.flour.id: 100, self.sugar.id: 50}
+        )
+        ShoppingListTotal.objects.apply_changes(
+            [self.user.id], {self.flour.id: 20, self.sugar.id: -50}
+        )
+        self.assertEqual(self.totals(), {self.flour.id: 120})
+
+    def test_conflicting_insert_is_retried_as_update(self):
+        update = QuerySet.update
+
+        def concurrent_update(queryset, **kwargs):
+            # Параллельный запрос вставил строку после чтения существующих.
+            result = update(queryset, **kwargs)
+            ShoppingListTotal.objects.bulk_create([ShoppingListTotal(
+                user=self.user, ingredient=self.flour, amount=30
+            )], ignore_conflicts=True)
+            return result
+
+        with mock.patch.object(QuerySet, 'update', concurrent_update):
+            ShoppingListTotal.objects.apply_changes(
+                [self.user.id], {self.flour.id: 100}
+            )
+        self.assertEqual(self.totals(), {self.flour.id: 130})
@@ -0,0 +1,58 @@
+from collections import OrderedDict
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from recipes.models import Recipe, encode_short_url
+from recipes.shortlinks import short_links
+
+User = get_user_model()
+
+
+class ShortLinkTests(TestCase):
+    """Перенаправление по короткой ссылке."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Author', last_name='Author', password='password'
+        )
+
+    def setUp(self):
+        patcher = mock.patch.multiple(
+            short_links, _known=OrderedDict(), _missing=OrderedDict(),
+            _codes={}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_recipe(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Recipe.objects.create(
+                author=self.author, name='Рецепт', text='Текст',
+                cooking_time=1, image='recipes/test.png'
+            )
+
+    def get(self, recipe_id):
+        return self.client.get(f'/s/{encode_short_url(recipe_id)}/')
+
+    def test_deleted_recipe_is_not_found(self):
+        recipe = self.create_recipe()
+        recipe_id = recipe.id
+        self.assertRedirects(
+            self.get(recipe_id), f'/recipes/{recipe_id}',
+            fetch_redirect_response=False
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+        self.assertEqual(self.get(recipe_id).status_code, 404)
+
+    def test_missing_code_is_cached_until_recipe_is_created(self):
+        next_id = self.create_recipe().id + 1
+        self.assertEqual(self.get(next_id).status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(next_id).status_code, 404)
+        self.assertEqual(self.create_recipe().id, next_id)
+        self.assertEqual(self.get(next_id).status_code, 302)
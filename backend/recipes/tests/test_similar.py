@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from recipes.models import Ingredient, IngredientRecipe, Recipe
+from recipes.similar import SimilarRecipeIndex
+
+User = get_user_model()
+
+
+class SimilarRecipeIndexTests(TestCase):
+    """Индекс похожих рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Author', last_name='Author', password='password'
+        )
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(6)
+        ]
+        cls.recipes = []
+        for number, indexes in enumerate(((0, 1, 2), (0, 1, 3), (0, 4, 5))):
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='Текст',
+                cooking_time=1, image='recipes/test.png'
+            )
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(
+                    recipe=recipe, ingredient=cls.ingredients[index],
+                    amount=1
+                )
+                for index in indexes
+            )
+            cls.recipes.append(recipe)
+
+    def search(self, index):
+        return [
+            recipe_id for recipe_id, _ in index.search(
+                self.recipes[0].id,
+                [ingredient.id for ingredient in self.ingredients[:3]],
+                10
+            )
+        ]
+
+    def test_most_similar_first(self):
+        index = SimilarRecipeIndex(0, 1)
+        self.assertEqual(
+            self.search(index), [self.recipes[1].id, self.recipes[2].id]
+        )
+
+    def test_search_reads_only_the_built_index(self):
+        index = SimilarRecipeIndex(0, 1)
+        found = self.search(index)
+        self.recipes[1].delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search(index), found)
+
+    def test_deleted_recipes_are_pruned_on_refresh(self):
+        index = SimilarRecipeIndex(0, 1)
+        self.search(index)
+        self.recipes[1].delete()
+        index.refresh()
+        self.assertEqual(self.search(index), [self.recipes[2].id])
+        self.assertEqual(
+            index._recipes.keys(), {self.recipes[0].id, self.recipes[2].id}
+        )
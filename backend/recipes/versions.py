@@ -0,0 +1,52 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+VERSION_KEY = 'version:{}'
+INGREDIENTS_VERSION = 'ingredients'
+TAGS_VERSION = 'tags'
+RECIPE_VERSION = 'recipe-{}'
+USER_VERSION = 'user-{}'
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def check_shared_cache():
+    """Ошибка, если версии из кэша не видны другим процессам."""
+    backend = settings.CACHES['default']['BACKEND']
+    if backend in PROCESS_LOCAL_CACHES:
+        raise ImproperlyConfigured(
+            f'Кэш {backend} виден только текущему процессу: версии, '
+            'изменённые здесь, не дойдут до веб-сервера. Укажите общий '
+            'кэш в CACHE_BACKEND и CACHE_LOCATION.'
+        )
+
+
+def get_version(name):
+    """Текущая версия набора данных: время последнего изменения в нс."""
+    return cache.get_or_set(
+        VERSION_KEY.format(name), time.time_ns, timeout=None
+    )
+
+
+def get_versions(names):
+    """Версии нескольких наборов данных за одно обращение к кэшу."""
+    keys = {VERSION_KEY.format(name): name for name in names}
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def bump_version(name):
+    """Смена версии набора данных после изменения."""
+    key = VERSION_KEY.format(name)
+    version = max(time.time_ns(), (cache.get(key) or 0) + 1)
+    cache.set(key, version, timeout=None)
+    return version
@@ -13,7 +13,8 @@ class FoodgramUserAdmin(UserAdmin):
     """Создание объекта пользователя в админ панели."""
 
     list_display = (
-        'username', 'email', 'first_name', 'last_name'
+        'username', 'email', 'first_name', 'last_name',
+        'recipes_count', 'followers_count'
     )
     list_display_links = ('username', 'email')
     list_filter = ('email', 'username')
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-17 13:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foodgramuser',
+            name='avatar_derivatives',
+            field=models.JSONField(default=dict, editable=False, verbose_name='Уменьшенные копии аватара'),
+        ),
+    ]
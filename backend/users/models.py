@@ -37,6 +37,15 @@ class FoodgramUser(AbstractUser):
         null=True,
         default=DEFAULT_AVATAR
     )
+    avatar_derivatives = models.JSONField(
+        'Уменьшенные копии аватара', default=dict, editable=False
+    )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов', default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0, editable=False
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']